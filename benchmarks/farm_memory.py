@@ -0,0 +1,85 @@
+"""
+Measure the memory used per loaded farm as a `FarmModel` and as a
+`CompactFarm`, for full 36 plot farms, with plots that carry their own copy
+of the shop tables (legacy) and plots that only reference the shop (slim).
+
+Usage: python -m benchmarks.farm_memory [farms]
+"""
+from datetime import datetime, timedelta
+import random
+import sys
+import tracemalloc
+
+import bson
+from bson import ObjectId
+
+from models.compact_farm import GRID_COLUMNS, GRID_ROWS, CompactFarm
+from models.farm import FarmModel
+from utils.plant_state import IMAGE_YIELD_MAP
+
+
+def slim_document(doc):
+    plot = {}
+    for plot_id, plot_item in doc["plot"].items():
+        data = {
+            k: v for k, v in plot_item["data"].items()
+            if k not in ("yields", "death_yields", "grow_time_hr")
+        }
+        plot[plot_id] = {**plot_item, "data": data}
+    return {**doc, "plot": plot}
+
+
+def synthetic_document(rng: random.Random):
+    now = datetime.utcnow()
+    plot = {}
+    for row in range(1, GRID_ROWS + 1):
+        for column in GRID_COLUMNS:
+            key = rng.choice(sorted(IMAGE_YIELD_MAP))
+            plot[f"{column}{row}"] = {
+                "key": key,
+                "data": {
+                    "yields_remaining": rng.randrange(1, 10),
+                    "last_harvested_at": now - timedelta(minutes=rng.randrange(600)),
+                    "yields": {
+                        key: {"odds": 1.0, "amount": 2, "min_amount": None, "max_amount": None, "xp": 5},
+                        "item:coin": {"odds": 0.2, "amount": 0, "min_amount": 1, "max_amount": 5, "xp": 0},
+                    },
+                    "death_yields": {
+                        key.replace("plant:", "seed:"): {"odds": 0.5, "amount": 1, "min_amount": None, "max_amount": None, "xp": 0},
+                    },
+                    "grow_time_hr": 2.0,
+                },
+            }
+
+    return {"_id": ObjectId(), "discord_id": str(rng.randrange(10 ** 17)), "plot": plot}
+
+
+def bytes_per_farm(load, docs):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    farms = [load(doc) for doc in docs]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del farms
+    return allocated / len(docs)
+
+
+def main(count=1000):
+    rng = random.Random(0)
+    docs = [synthetic_document(rng) for _ in range(count)]
+
+    slim_docs = [slim_document(doc) for doc in docs]
+
+    print(f"{'documents':<12} {'representation':<16} {'bytes/farm':>12} {'bson bytes':>12}")
+    for name, batch in (("legacy", docs), ("slim", slim_docs)):
+        bson_size = sum(len(bson.encode(doc)) for doc in batch) / len(batch)
+        for load in (FarmModel.from_document, CompactFarm.from_document):
+            allocated = bytes_per_farm(load, batch)
+            representation = load.__qualname__.split(".")[0]
+            print(f"{name:<12} {representation:<16} {allocated:>12.0f} {bson_size:>12.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
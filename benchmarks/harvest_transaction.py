@@ -0,0 +1,102 @@
+"""
+Check that concurrent harvests of the same farm are applied exactly once and
+that the farm and inventory always agree, and time a harvest. Writes a
+throwaway user and farm to the database at MONGO_URI and removes them after.
+
+Run it against a replica set (`make mongodb-rs`) to exercise transactions,
+or a standalone server to exercise the fallback.
+
+Usage: python -m benchmarks.harvest_transaction [rounds]
+"""
+import asyncio
+from datetime import datetime, timedelta
+import sys
+import time
+
+from db.database import Database
+from db.harvest import harvest_farm
+from db.shop_data import ShopData
+from db.user_cache import UserCache
+from models.farm import COLLECTION_NAME as FARMS_COLLECTION_NAME
+from models.farm import FarmModel
+from models.shop import ShopModel
+from models.user import COLLECTION_NAME as USERS_COLLECTION_NAME
+from models.user import UserModel
+from models.yieldmodel import YieldModel
+from utils.plant_state import IMAGE_YIELD_MAP
+
+DISCORD_ID = "benchmark-harvest"
+CONCURRENT_HARVESTS = 4
+
+
+def synthetic_seed():
+    key = sorted(IMAGE_YIELD_MAP)[0].replace("plant:", "seed:")
+    return ShopModel(
+        key=key,
+        grow_time_hr=1,
+        total_yields=100,
+        yields={"item:benchmark": YieldModel(amount=1, xp=1)},
+    )
+
+
+async def reset(seed: ShopModel):
+    await UserModel(discord_id=DISCORD_ID).save()
+    farm = FarmModel(discord_id=DISCORD_ID, plot={})
+    for plot_id in ("A1", "B2", "C3"):
+        farm.plant(plot_id, seed)
+        farm.plot[plot_id].data.last_harvested_at -= timedelta(hours=1)
+    await farm.save_plot()
+
+
+async def cleanup():
+    database = Database.get_instance()
+    await database.get_collection(USERS_COLLECTION_NAME).delete_many({"discord_id": DISCORD_ID})
+    await database.get_collection(FARMS_COLLECTION_NAME).delete_many({"discord_id": DISCORD_ID})
+    UserCache.get_instance().invalidate(DISCORD_ID)
+
+
+async def main(rounds=10):
+    seed = synthetic_seed()
+    ShopData.set_data([seed], [seed])
+    transactions = await Database.get_instance().supports_transactions()
+    print(f"transactions: {'yes' if transactions else 'no (standalone fallback)'}")
+
+    failures = 0
+    elapsed = []
+    await cleanup()
+    try:
+        for _ in range(rounds):
+            await cleanup()
+            await reset(seed)
+
+            # Every harvest starts from the same loaded farm, only one can win
+            farms = [await FarmModel.find_by_discord_id(DISCORD_ID) for _ in range(CONCURRENT_HARVESTS)]
+            start = time.perf_counter()
+            results = await asyncio.gather(*(harvest_farm(farm) for farm in farms))
+            elapsed.append((time.perf_counter() - start) / CONCURRENT_HARVESTS)
+
+            saved = [result for result in results if result]
+            user = await UserModel.find_by_discord_id(DISCORD_ID)
+            farm = await FarmModel.find_by_discord_id(DISCORD_ID)
+            given = user.inventory.get("item:benchmark")
+            remaining = sum(plot.data.yields_remaining for plot in farm.plot.values())
+
+            if len(saved) != 1:
+                failures += 1
+                print(f"{len(saved)} of {CONCURRENT_HARVESTS} concurrent harvests were saved")
+            elif not given or given.amount != saved[0][0]["item:benchmark"].amount:
+                failures += 1
+                print(f"Inventory {given} doesn't match harvest {saved[0][0]}")
+            elif remaining != 3 * (seed.total_yields - 1):
+                failures += 1
+                print(f"Farm has {remaining} yields remaining after one harvest")
+    finally:
+        await cleanup()
+
+    print(f"avg harvest ms: {sum(elapsed) / len(elapsed) * 1000:.2f}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10))
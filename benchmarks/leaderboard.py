@@ -0,0 +1,98 @@
+"""
+Compare leaderboard queries on a synthetic users collection: a top page and
+a rank lookup without indexes, with indexes, and through `Leaderboard`'s
+caches. Writes to the `dafarmz_benchmark` database at MONGO_URI, which is
+dropped afterwards.
+
+Usage: python -m benchmarks.leaderboard [users]
+"""
+import asyncio
+import random
+import sys
+import time
+
+from pymongo import DESCENDING, InsertOne
+
+from db.database import Database
+from db.leaderboard import BOARDS, Leaderboard
+
+DATABASE_NAME = "dafarmz_benchmark"
+COLLECTION_NAME = "users"
+GUILDS = 50
+BATCH_SIZE = 10000
+
+
+async def populate(collection, count: int):
+    rng = random.Random(0)
+    batch = []
+    for i in range(count):
+        batch.append(InsertOne({
+            "discord_id": str(10 ** 17 + i),
+            "balance": rng.randrange(0, 10 ** 6),
+            "stats": {
+                "xp": int(rng.paretovariate(1.2) * 100),
+                "harvest": {"count": rng.randrange(0, 5000)},
+            },
+            "guild_ids": [str(rng.randrange(GUILDS))],
+        }))
+        if len(batch) == BATCH_SIZE:
+            await collection.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+
+
+async def timed(label, fn, runs=5):
+    start = time.perf_counter()
+    for _ in range(runs):
+        result = await fn()
+    ms = (time.perf_counter() - start) / runs * 1000
+    print(f"{label:<36} {ms:>10.2f}")
+    return result
+
+
+async def main(count=1_000_000):
+    collection = Database.get_instance().get_collection(COLLECTION_NAME, DATABASE_NAME)
+    await collection.drop()
+    try:
+        print(f"inserting {count:,} users...")
+        await populate(collection, count)
+
+        field = BOARDS["xp"]
+        score = 500
+
+        async def naive_top():
+            cursor = collection.find({}, {"discord_id": 1, field: 1}).sort(field, DESCENDING).limit(10)
+            return await cursor.to_list(length=10)
+
+        async def naive_rank():
+            return await collection.count_documents({field: {"$gt": score}}) + 1
+
+        print(f"{'query':<36} {'ms':>10}")
+        await timed("top 10, no index", naive_top)
+        await timed("rank, no index", naive_rank, runs=2)
+
+        leaderboard = Leaderboard(
+            top_n=100, collection_name=COLLECTION_NAME, database_name=DATABASE_NAME)
+        await leaderboard.ensure_indexes()
+
+        await timed("top 10, indexed", naive_top)
+        await timed("rank, indexed count", naive_rank)
+        await timed("guild top 100, indexed", lambda: leaderboard.top("xp", "1"), runs=1)
+
+        leaderboard.invalidate()
+        await timed("top 100, cold cache", lambda: leaderboard.top("xp"), runs=1)
+        await timed("top 100, cached", lambda: leaderboard.top("xp"), runs=1000)
+        await timed("rank snapshot refresh", lambda: leaderboard.rank("xp", score), runs=1)
+        rank = await timed("rank, binary search", lambda: leaderboard.rank("xp", score), runs=1000)
+
+        expected = await naive_rank()
+        if rank != expected:
+            print(f"rank mismatch: {rank} != {expected}")
+            sys.exit(1)
+    finally:
+        await collection.drop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000))
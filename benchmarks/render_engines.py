@@ -0,0 +1,53 @@
+"""
+Check that the numpy compositing engine produces byte-identical images to
+the pillow engine and compare how long each takes to composite a farm.
+
+Usage: python -m benchmarks.render_engines [runs]
+"""
+import sys
+import time
+
+from benchmarks.render_modes import representative_layouts
+from images.compositing import ENGINES, paste_sprites
+from images.merge import generate_base_image, plot_id_to_grid
+from images.sprite_atlas import SpriteAtlas
+from utils.plant_state import IMAGE_YIELD_MAP
+
+
+def layout_placements(layout):
+    atlas = SpriteAtlas.get_instance()
+    placements = []
+    for plot_id, key, stage in layout:
+        sprite = atlas.get(IMAGE_YIELD_MAP[key][stage])
+        placements.append((sprite, sprite.position(*plot_id_to_grid(plot_id))))
+    return placements
+
+
+def main(runs=50):
+    SpriteAtlas.get_instance().load()
+
+    failures = 0
+    print(f"{'farm':<8} {'engine':<8} {'ms':>8}")
+    for name, layout in representative_layouts().items():
+        placements = layout_placements(layout)
+        golden = paste_sprites(
+            generate_base_image(), placements, "pillow").tobytes()
+
+        for engine in ENGINES:
+            image = paste_sprites(generate_base_image(), placements, engine)
+            if image.tobytes() != golden:
+                failures += 1
+                print(f"{name}: {engine} output differs from pillow")
+
+            start = time.perf_counter()
+            for _ in range(runs):
+                paste_sprites(generate_base_image(), placements, engine)
+            elapsed = (time.perf_counter() - start) / runs
+
+            print(f"{name:<8} {engine:<8} {elapsed * 1000:>8.2f}")
+
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main(int(sys.argv[1]) if len(sys.argv) > 1 else 50) else 0)
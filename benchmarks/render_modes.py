@@ -0,0 +1,65 @@
+"""
+Compare encoded size and encode time of every render output mode on a set of
+representative farms.
+
+Usage: python -m benchmarks.render_modes [runs]
+"""
+import random
+import sys
+import time
+
+from images.encoding import OUTPUT_FORMATS, OutputMode, encode_image
+from images.merge import generate_layout_image
+from images.sprite_atlas import SpriteAtlas
+from utils.plant_state import IMAGE_YIELD_MAP
+
+PLOT_IDS = [f"{letter}{number}" for number in range(1, 7)
+            for letter in "ABCDEF"]
+
+
+def representative_layouts():
+    """
+    Build layouts for an empty farm, a freshly planted farm, an all ripe
+    farm and a random farm at mixed stages.
+    """
+    rng = random.Random(0)
+    keys = sorted(IMAGE_YIELD_MAP)
+
+    def planted(stage_for):
+        layout = []
+        for plot_id in PLOT_IDS:
+            key = rng.choice(keys)
+            layout.append((plot_id, key, stage_for(key)))
+        return layout
+
+    return {
+        "empty": [],
+        "planted": planted(lambda key: 0),
+        "ripe": planted(lambda key: len(IMAGE_YIELD_MAP[key]) - 1),
+        "mixed": planted(lambda key: rng.randrange(len(IMAGE_YIELD_MAP[key]))),
+    }
+
+
+def main(runs=20):
+    SpriteAtlas.get_instance().load()
+
+    modes = [OutputMode(format, level)
+             for format in OUTPUT_FORMATS for level in (1, 6, 9)]
+
+    print(f"{'farm':<8} {'mode':<16} {'bytes':>8} {'encode ms':>10}")
+    for name, layout in representative_layouts().items():
+        image = generate_layout_image(layout)
+        for mode in modes:
+            # Warm up once so palette construction isn't measured
+            size = len(encode_image(image, mode))
+
+            start = time.perf_counter()
+            for _ in range(runs):
+                encode_image(image, mode)
+            elapsed = (time.perf_counter() - start) / runs
+
+            print(f"{name:<8} {mode.key:<16} {size:>8} {elapsed * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -1,5 +1,6 @@
 import discord
 from discord.ext import commands
+from db.challenge_data import ChallengeData
 from models.user import UserModel
 from utils.embeds import create_embed_for_challenges
 from utils.users import require_user
@@ -25,6 +26,14 @@ class Challenges(discord.Cog):
             ctx.author.display_name, profile.challenges)
         return await ctx.respond("", view=challenges_view, embed=challenges_embed)
 
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """
+        Load the challenge catalog when bot is ready.
+        """
+        await ChallengeData.load()
+        ChallengeData.start_refresh()
+
 
 def setup(bot):
     bot.add_cog(Challenges(bot))
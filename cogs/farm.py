@@ -1,10 +1,12 @@
 import logging
+from datetime import timezone
 
 import discord
 from discord.ext import commands
+from db.harvest import harvest_farm
 from db.shop_data import ShopData
 
-from images.render import render_farm
+from images.render import FARM_IMAGE_FILENAME, farm_image_files, render_farm
 from models.farm import FarmModel
 from models.user import UserModel
 from utils.emoji_map import EMOJI_MAP
@@ -25,15 +27,24 @@ class Farm(commands.Cog):
             color=discord.Color.embed_background()
         )
 
-        embed.set_image(url="attachment://farm.png")
+        next_change = farm.next_stage_change()
+        if next_change:
+            embed.description = "Next change " + discord.utils.format_dt(
+                next_change.replace(tzinfo=timezone.utc), "R")
+
+        embed.set_image(url=f"attachment://{FARM_IMAGE_FILENAME}")
         return embed
 
     async def start_farm_view(
             self, ctx: discord.context.ApplicationContext, farm: FarmModel):
+        # Rendering may have to wait for a free worker
+        await ctx.defer()
+
         farm_view = FarmView(farm, ctx.author)
-        await ctx.respond(embed=self.create_farm_embed(ctx, farm),
+        embed = self.create_farm_embed(ctx, farm)
+        await ctx.respond(embed=embed,
                           view=farm_view,
-                          files=[await render_farm(farm)])
+                          files=farm_image_files(embed, await render_farm(farm)))
 
     @commands.slash_command(name="farm", description="View your farm")
     @commands.cooldown(1, 5, commands.BucketType.user)
@@ -60,19 +71,11 @@ class Farm(commands.Cog):
         if not await require_user(ctx, farm):
             return
 
-        (harvest_yield, xp_earned) = farm.harvest()
-        await farm.save_plot()
-
-        await UserModel.give_items(ctx.author.id, harvest_yield, 0, {
-            "xp": xp_earned,
-            "harvest.xp": xp_earned,
-            "harvest.count": 1,
-            **{
-                f"harvest.{item_key}": amount
-                for item_key, amount in harvest_yield.items()
-            }
-        })
+        result = await harvest_farm(farm)
+        if not result:
+            return await ctx.respond("Your farm changed while harvesting, please try again.", ephemeral=True)
 
+        (harvest_yield, xp_earned) = result
         logger.info(f"User {ctx.author.id} harvested {harvest_yield}")
 
         formatted_yield = ""
@@ -94,29 +97,30 @@ class Farm(commands.Cog):
                     location: discord.Option(str, "The location to plant the crop (e.g. A1)", required=True), # type: ignore
                     seed: discord.Option(str, "Seed to plant", required=False)): # type: ignore
         # fmt: on
-        user = await UserModel.find_by_discord_id(ctx.author.id)
+        user, farm = await UserModel.find_with_farm(ctx.author.id)
         if not await require_user(ctx, user):
             return
 
         if seed:
-            farm = await FarmModel.find_by_discord_id(ctx.author.id)
             shop_data = ShopData.buyable()
             item = next(
                 (item for item in shop_data if item.key == seed), None)
 
-            if item and farm.plant(location, item):
-                await farm.save_plot()
+            if item and farm and farm.plant(location, item) and await farm.save_plot():
                 await ctx.respond(f"You've planted a {seed} on your farm!")
                 await UserModel.inc_stat(user.discord_id, f"plant.{item.key}")
+                await UserModel.increment_challenge_progress(
+                    user.discord_id, "plant", item.key)
             else:
                 await ctx.respond("You can't plant that here!")
         else:
             async def _on_plant_callback(seed, view: ChooseSeedView):
                 farm = await FarmModel.find_by_discord_id(ctx.author.id)
-                if farm.plant(location, seed):
-                    await farm.save_plot()
+                if farm.plant(location, seed) and await farm.save_plot():
                     await view.message.edit(f"You've planted a {seed.name} {EMOJI_MAP[seed.key]} on {location}!", view=None)
                     await UserModel.inc_stat(user.discord_id, f"plant.{seed.key}")
+                    await UserModel.increment_challenge_progress(
+                        user.discord_id, "plant", seed.key)
                 else:
                     await view.message.edit("You can't plant that here!", view=None)
 
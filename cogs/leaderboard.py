@@ -0,0 +1,98 @@
+import logging
+from collections import OrderedDict
+
+import discord
+from discord.ext import commands
+
+from db.leaderboard import BOARDS, Leaderboard, get_score
+from models.user import UserModel
+from utils.currency import format_currency
+from utils.users import require_user
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 10
+# Recently recorded (discord id, guild id) pairs to remember
+SEEN_MEMBERS_SIZE = 10000
+
+
+def format_score(board, score):
+    if board == "balance":
+        return format_currency(score)
+    return f"{int(score):,}"
+
+
+class LeaderboardCog(commands.Cog, name="Leaderboard"):
+    def __init__(self, bot):
+        self.bot = bot
+        # (discord id, guild id) pairs recently recorded by this process, as
+        # an LRU
+        self.seen_members = OrderedDict()
+
+    @commands.slash_command(name="leaderboard", description="View the top farmers")
+    @commands.cooldown(1, 5, commands.BucketType.user)
+    async def leaderboard(self,
+        # fmt: off
+                          ctx: discord.context.ApplicationContext,
+                          board: discord.Option(str, choices=list(BOARDS), description="What to rank by", required=False) = "xp", # type: ignore
+                          scope: discord.Option(str, choices=["Global", "Server"], description="Rank everyone or only this server", required=False) = "Global", # type: ignore
+                          page: discord.Option(int, description="The page to view", min_value=1, required=False) = 1): # type: ignore
+        # fmt: on
+        user = await UserModel.find_partial(
+            ctx.author.id, [BOARDS[board], "guild_ids"])
+        if not await require_user(ctx, user):
+            return
+
+        # Ranking can take a moment when a board's scores are first loaded
+        await ctx.defer()
+
+        guild_id = ctx.guild.id if scope == "Server" and ctx.guild else None
+        leaderboard = Leaderboard.get_instance()
+
+        score = get_score(user.model_dump(), board)
+
+        # Load the cached page, then make sure it shows the user's own
+        # latest score
+        await leaderboard.top(board, guild_id)
+        leaderboard.record(board, user.discord_id, score, user.guild_ids)
+        top = await leaderboard.top(board, guild_id)
+        rank = await leaderboard.rank(board, score, guild_id)
+
+        start = (page - 1) * PAGE_SIZE
+        entries = top[start:start + PAGE_SIZE]
+        lines = [
+            f"**{start + i + 1}.** <@{discord_id}> – {format_score(board, entry_score)}"
+            for i, (discord_id, entry_score) in enumerate(entries)
+        ]
+
+        embed = discord.Embed(
+            title=f"{'Server' if guild_id else 'Global'} {board} leaderboard",
+            description="\n".join(lines) or "Nobody here yet.",
+            color=discord.Color.embed_background()
+        )
+        embed.set_footer(
+            text=f"Your rank: #{rank:,} ({format_score(board, score)})")
+
+        await ctx.respond(embed=embed)
+
+    @commands.Cog.listener()
+    async def on_application_command(self, ctx: discord.context.ApplicationContext):
+        """
+        Remember which guilds users play in for per-guild leaderboards.
+        """
+        if not ctx.guild:
+            return
+
+        member = (str(ctx.author.id), str(ctx.guild.id))
+        if member in self.seen_members:
+            self.seen_members.move_to_end(member)
+            return
+
+        self.seen_members[member] = True
+        if len(self.seen_members) > SEEN_MEMBERS_SIZE:
+            self.seen_members.popitem(last=False)
+        await UserModel.add_guild(*member)
+
+
+def setup(bot):
+    bot.add_cog(LeaderboardCog(bot))
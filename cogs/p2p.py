@@ -4,7 +4,7 @@ from datetime import datetime
 import discord
 from discord.ext import commands
 
-from models.user import UserModel
+from models.user import TransferResult, UserModel
 from utils.currency import format_currency
 from utils.users import require_user
 
@@ -43,28 +43,22 @@ class P2P(commands.Cog):
                   user: discord.Option(discord.User, description="User to pay", required=True), # type: ignore
                   amount: discord.Option(float, description="Amount to pay", required=True)): # type: ignore
         # fmt: on
-        if not await require_user(ctx, await UserModel.find_by_discord_id(ctx.author.id)):
-            return
-
         if amount <= 0:
             return await ctx.respond("Stop being stingy, you can only pay someone with an amount greater than 0.", ephemeral=True)
 
         # Database stores balance in cents
         amount = int(amount * 100)
 
-        user_model = await UserModel.find_by_discord_id(ctx.author.id)
-        if user_model.balance < amount:
-            return await ctx.respond(f"You don't have enough money!\n**Balance**: {format_currency(user_model.balance)}", ephemeral=True)
-
-        user_model.balance -= amount
-        await user_model.save()
+        result = await UserModel.transfer(ctx.author.id, user.id, amount)
+        if result == TransferResult.SENDER_NOT_FOUND:
+            return await require_user(ctx, None)
 
-        recipient_model = await UserModel.find_by_discord_id(user.id)
-        if recipient_model is None:
+        if result == TransferResult.RECIPIENT_NOT_FOUND:
             return await ctx.respond("Recipient does not have a farm.\nAsk them to create one using `/setup` and try again.", ephemeral=True)
 
-        recipient_model.balance += amount
-        await recipient_model.save()
+        if result == TransferResult.INSUFFICIENT_FUNDS:
+            balance = await UserModel.find_partial(ctx.author.id, ["balance"])
+            return await ctx.respond(f"You don't have enough money!\n**Balance**: {format_currency(balance.balance)}", ephemeral=True)
 
         await ctx.respond(embed=create_transfer_receipt("Transfer", ctx.author.id, user.id, amount))
 
@@ -9,6 +9,7 @@ from models.farm import FarmModel
 from models.user import UserModel
 from utils.currency import format_currency
 from utils.emoji_map import EMOJI_MAP
+from utils.growth import compute_compact_growth
 from utils.level_calculator import level_based_on_xp, xp_required_for_level, next_level_xp
 from utils.progress_bar import construct_xp_progress_bar
 from utils.users import require_user
@@ -23,12 +24,14 @@ class Profile(commands.Cog):
     @commands.slash_command(name="setup", description="Start your farm")
     @commands.cooldown(1, 30, commands.BucketType.user)
     async def setup(self, ctx: discord.context.ApplicationContext):
-        farm = await FarmModel.find_by_discord_id(ctx.author.id)
+        user, farm = await UserModel.find_with_farm(ctx.author.id)
+        if not farm and not user:
+            # A farm without a user is left over from an interrupted setup
+            farm = await FarmModel.find_by_discord_id(ctx.author.id)
         if not farm:
             farm = FarmModel(discord_id=str(ctx.author.id), plot={})
             await farm.save_plot()
 
-        user = await UserModel.find_by_discord_id(ctx.author.id)
         if not user:
             user = UserModel(discord_id=str(ctx.author.id),
                              balance=100, inventory={},
@@ -44,7 +47,8 @@ class Profile(commands.Cog):
         """
         /profile - View the user's profile.
         """
-        profile = await UserModel.find_by_discord_id(ctx.author.id)
+        profile = await UserModel.find_partial(
+            ctx.author.id, ["balance", "created_at", "stats.xp"])
         if not await require_user(ctx, profile):
             return
 
@@ -53,12 +57,20 @@ class Profile(commands.Cog):
             "Use </stats:1207963367864795207> to view statistics about your farm.",
         ])
 
+        # Read-only, so the farm is loaded compact without per-plot models
+        farm = await FarmModel.find_compact_by_discord_id(ctx.author.id)
+        farm_summary = "No farm yet"
+        if farm:
+            growth = compute_compact_growth([farm])[0]
+            farm_summary = f"{len(growth.plot_ids)} planted, {int(growth.harvestable.sum())} ready to harvest"
+
         xp = profile.stats.get("xp", 0)
         next_milestone = next_level_xp(xp)
         embed = discord.Embed(
             title=f"{ctx.author.display_name}'s Profile :farmer:",
             description=f"""**Balance**: {format_currency(profile.balance)}
 **Joined**: {profile.created_at.strftime("%b %d, %Y")}
+**Farm**: {farm_summary}
 
 **Level {profile.current_level}** – {xp}/{next_milestone} XP:
 {construct_xp_progress_bar(int(xp), 8)}
@@ -74,7 +86,7 @@ class Profile(commands.Cog):
     @commands.slash_command(name="inventory", description="View your inventory")
     @commands.cooldown(1, 6, commands.BucketType.user)
     async def inventory(self, ctx: discord.context.ApplicationContext):
-        profile = await UserModel.find_by_discord_id(ctx.author.id)
+        profile = await UserModel.find_partial(ctx.author.id, ["inventory"])
         if await require_user(ctx, profile):
             return await ctx.respond(
                 embed=self.inventory_to_embed(profile.inventory),
@@ -83,8 +95,7 @@ class Profile(commands.Cog):
     @commands.slash_command(name="vote", description="Vote for the bot to earn rewards")
     @commands.cooldown(1, 10, commands.BucketType.user)
     async def vote(self, ctx: discord.context.ApplicationContext):
-        profile = await UserModel.find_by_discord_id(ctx.author.id)
-        if not await require_user(ctx, profile):
+        if not await require_user(ctx):
             return
 
         embed = discord.Embed(
@@ -107,7 +118,7 @@ Thank you for helping us grow!""",
     @commands.slash_command(name="stats", description="View your farming stats")
     @commands.cooldown(1, 4, commands.BucketType.user)
     async def stats(self, ctx: discord.context.ApplicationContext):
-        profile = await UserModel.find_by_discord_id(ctx.author.id)
+        profile = await UserModel.find_partial(ctx.author.id, ["stats"])
         if not await require_user(ctx, profile):
             return
 
@@ -53,7 +53,7 @@ class Shop(commands.Cog):
         if len(shop_data) == 0:
             return await ctx.respond("Shop is not ready yet. Come back later.", ephemeral=True)
 
-        user = await UserModel.find_by_discord_id(ctx.author.id)
+        user = await UserModel.find_partial(ctx.author.id, ["stats.xp"])
         if not await require_user(ctx, user):
             return
 
@@ -86,7 +86,7 @@ class Shop(commands.Cog):
                   name: discord.Option(str, autocomplete=discord.utils.basic_autocomplete(get_purchasables), description="The name of the item to buy", required=False), # type: ignore
                   amount: discord.Option(int, description="The amount of the item to buy", required=False) = 1): # type: ignore
     # fmt: on
-        if not await require_user(ctx, await UserModel.find_by_discord_id(ctx.author.id)):
+        if not await require_user(ctx):
             return
 
         shop_data = ShopData.buyable()
@@ -100,6 +100,8 @@ class Shop(commands.Cog):
             async def _on_purchase_callback(view, item, item_name, quantity, cost):
                 success = await UserModel.give_item(ctx.author.id, item, quantity, cost)
                 if success:
+                    await UserModel.increment_challenge_progress(
+                        ctx.author.id, "buy", item, quantity)
                     receipt = create_receipt(
                         "buy",
                         ctx.author.id, item_name, quantity, cost)
@@ -122,6 +124,8 @@ class Shop(commands.Cog):
             value_amount = full_item.cost * amount
             success = await UserModel.give_item(ctx.author.id, full_item.key, amount, value_amount)
             if success:
+                await UserModel.increment_challenge_progress(
+                    ctx.author.id, "buy", full_item.key, amount)
                 receipt = create_receipt(
                     "buy",
                     ctx.author.id, name, amount,
@@ -141,7 +145,7 @@ class Shop(commands.Cog):
                   name: discord.Option(str, autocomplete=discord.utils.basic_autocomplete(get_purchasables), description="The name of the item to buy", required=False), # type: ignore
                   amount: discord.Option(int, description="The amount of the item to sell", required=False) = 1): # type: ignore
     # fmt: on
-        if not await require_user(ctx, await UserModel.find_by_discord_id(ctx.author.id)):
+        if not await require_user(ctx):
             return
 
         shop_data = ShopData.buyable()
@@ -154,6 +158,8 @@ class Shop(commands.Cog):
             async def _on_purchase_callback(view, item, item_name, quantity, cost):
                 success = await UserModel.remove_item(ctx.author.id, item, quantity)
                 if success:
+                    await UserModel.increment_challenge_progress(
+                        ctx.author.id, "sell", item, quantity)
                     receipt = create_receipt(
                         "sell",
                         ctx.author.id, item_name, quantity, cost)
@@ -176,6 +182,8 @@ class Shop(commands.Cog):
             value_amount = full_item.resell_price * amount
             success = await UserModel.remove_item(ctx.author.id, full_item.key, amount, value_amount)
             if success:
+                await UserModel.increment_challenge_progress(
+                    ctx.author.id, "sell", full_item.key, amount)
                 receipt = create_receipt(
                     "sell",
                     ctx.author.id, name, amount,
@@ -195,8 +203,7 @@ class Shop(commands.Cog):
         buyable_items = await ShopModel.find_buyable()
 
         # Populate shop data
-        ShopData.get_instance().all_shop_data = all_items
-        ShopData.get_instance().buyable_data = buyable_items
+        ShopData.set_data(all_items, buyable_items)
 
 
 def setup(bot):
@@ -0,0 +1,101 @@
+import asyncio
+import bisect
+import logging
+import os
+import random
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from db.database import Database
+from models.challenges import COLLECTION_NAME, ChallengeOptionModel, ChallengesModel
+
+DEFAULT_REFRESH_SECONDS = 600
+
+logger = logging.getLogger(__name__)
+
+
+class ChallengeData:
+    """
+    The challenge catalog, kept in memory and sorted by level. The challenges
+    available at a level are always a prefix of the catalog, so sampling
+    them needs a binary search and `k` index draws instead of a query.
+
+    Reloaded from the collection every `CHALLENGE_REFRESH_SECONDS` seconds
+    once `start_refresh` is called.
+    """
+
+    def __init__(self):
+        self.challenges: List[Dict] = []
+        self.levels: List[int] = []
+        self.refresh_seconds = float(os.getenv(
+            "CHALLENGE_REFRESH_SECONDS", DEFAULT_REFRESH_SECONDS))
+        self._task: Optional[asyncio.Task] = None
+        self._instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if not hasattr(cls, "_instance"):
+            cls._instance = cls()
+        return cls._instance
+
+    @classmethod
+    def set_data(cls, challenges: List[Dict]):
+        instance = cls.get_instance()
+        challenges = sorted(challenges, key=lambda c: c.get("level", 0))
+        # Swap both at once so readers never see them out of step
+        instance.challenges, instance.levels = (
+            challenges, [c.get("level", 0) for c in challenges])
+
+    @classmethod
+    async def load(cls):
+        collection = Database.get_instance().get_collection(COLLECTION_NAME)
+        challenges = await collection.find({}).to_list(length=None)
+        cls.set_data(challenges)
+        logger.debug(f"Loaded {len(challenges)} challenges")
+
+    @classmethod
+    def start_refresh(cls):
+        instance = cls.get_instance()
+        if instance._task is None or instance._task.done():
+            instance._task = asyncio.create_task(instance._refresh_forever())
+
+    async def _refresh_forever(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.load()
+            except Exception as e:
+                logger.error(f"Failed to refresh challenges: {e}")
+
+    @classmethod
+    def sample(cls, for_level: int, amount: int, rng: random.Random = random) -> List[Dict]:
+        """
+        Pick up to `amount` distinct challenges available at a level.
+
+        :param for_level: The level of the user as int.
+        :param amount: The amount of challenges to pick.
+        :param rng: The random number generator to draw with.
+        :return: The picked challenge documents.
+        """
+        instance = cls.get_instance()
+        challenges, levels = instance.challenges, instance.levels
+        available = bisect.bisect_right(levels, for_level)
+        return [challenges[i] for i in rng.sample(range(available), min(amount, available))]
+
+    @classmethod
+    async def generate(cls, for_level: int, amount=3) -> ChallengesModel:
+        """
+        Generate random challenges for a user based on their level, see
+        `ChallengesModel.generate`. Falls back to querying the collection if
+        the catalog hasn't been loaded yet.
+        """
+        if not cls.get_instance().challenges:
+            return await ChallengesModel.generate(for_level, amount)
+
+        return ChallengesModel(
+            last_refreshed_at=datetime.utcnow(),
+            options=[
+                ChallengeOptionModel(**challenge)
+                for challenge in cls.sample(for_level, amount)
+            ],
+        )
@@ -0,0 +1,160 @@
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from models.challenges import ChallengesModel
+
+DEFAULT_MAX_USERS = 4096
+
+# (action, item), e.g. ("harvest", "plant:apple")
+EventKey = Tuple[str, str]
+
+
+class TrackedChallenges:
+    """
+    A user's challenge options indexed by the events they count.
+    """
+    __slots__ = ("descriptions", "paths", "remaining", "unknown", "completed")
+
+    def __init__(self, challenges: Optional[ChallengesModel]):
+        options = challenges.options if challenges else []
+        self.descriptions = [option.description for option in options]
+        # (action, item) -> indexes of accepted options counting it
+        self.paths: Dict[EventKey, List[int]] = {}
+        # option index -> (action, item) -> progress still needed
+        self.remaining: Dict[int, Dict[EventKey, float]] = {}
+        # Options with goals that aren't per item, completion unknown
+        self.unknown: Set[int] = set()
+        self.completed: Set[int] = set()
+
+        for index, option in enumerate(options):
+            remaining = {}
+            for action, goals in option.goal_stats.items():
+                if not isinstance(goals, dict):
+                    self.unknown.add(index)
+                    continue
+
+                for item, goal_amount in goals.items():
+                    progress = option.progress.get(action, {}).get(item, 0)
+                    remaining[(action, item)] = goal_amount - progress
+                    if option.accepted:
+                        self.paths.setdefault((action, item), []).append(index)
+
+            self.remaining[index] = remaining
+            self._check(index)
+
+    def _check(self, index: int):
+        if index not in self.unknown and all(v <= 0 for v in self.remaining[index].values()):
+            self.completed.add(index)
+
+
+class ChallengeProgress:
+    """
+    Resolves challenge events (plant, harvest, buy, sell, ...) to the exact
+    progress updates they cause, without reading the user first. Users are
+    tracked from their last loaded or written challenges, for at most
+    `CHALLENGE_ENGINE_SIZE` users. Completion is kept up to date as progress
+    is applied, so it never has to be recomputed.
+
+    Only the positions of options are assumed, so every planned update is
+    conditional on the options still being there (see `plan`).
+    """
+
+    def __init__(self, max_users: Optional[int] = None):
+        if max_users is None:
+            max_users = int(os.getenv("CHALLENGE_ENGINE_SIZE", DEFAULT_MAX_USERS))
+
+        self.max_users = max_users
+        self.users: OrderedDict[str, TrackedChallenges] = OrderedDict()
+        self.planned = 0
+        self.skipped = 0
+        self.untracked = 0
+        self._instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if not hasattr(cls, "_instance"):
+            cls._instance = cls()
+        return cls._instance
+
+    def track(self, discord_id, challenges: Optional[ChallengesModel]):
+        if self.max_users <= 0:
+            return
+
+        key = str(discord_id)
+        self.users.pop(key, None)
+        self.users[key] = TrackedChallenges(challenges)
+        while len(self.users) > self.max_users:
+            self.users.popitem(last=False)
+
+    def forget(self, discord_id):
+        self.users.pop(str(discord_id), None)
+
+    def plan(self, discord_id, increments: Dict[EventKey, int]) -> Optional[Tuple[Dict, Dict]]:
+        """
+        Work out the update for a batch of events.
+
+        :param discord_id: The discord ID of the user.
+        :param increments: (action, item) -> amount.
+        :return: None if the user isn't tracked. Otherwise a tuple of the
+        `$inc` to apply and the conditions the user document must still
+        meet, both empty if no accepted challenge counts these events.
+        """
+        tracked = self.users.get(str(discord_id))
+        if tracked is None:
+            self.untracked += 1
+            return None
+
+        self.users.move_to_end(str(discord_id))
+        inc = {}
+        conditions = {}
+        for (action, item), amount in increments.items():
+            for index in tracked.paths.get((action, item), ()):
+                inc[f"challenges.options.{index}.progress.{action}.{item}"] = amount
+                conditions[f"challenges.options.{index}.accepted"] = True
+                conditions[f"challenges.options.{index}.description"] = tracked.descriptions[index]
+
+        if inc:
+            self.planned += 1
+        else:
+            self.skipped += 1
+        return (inc, conditions)
+
+    def apply(self, discord_id, increments: Dict[EventKey, int]):
+        """
+        Record that a planned update was written.
+        """
+        tracked = self.users.get(str(discord_id))
+        if tracked is None:
+            return
+
+        for key, amount in increments.items():
+            for index in tracked.paths.get(key, ()):
+                tracked.remaining[index][key] -= amount
+                tracked._check(index)
+
+    def is_completed(self, discord_id, option_index: int, description: Optional[str] = None) -> Optional[bool]:
+        """
+        :param description: The description of the option the caller has,
+        to make sure both are talking about the same option.
+        :return: Whether a challenge option is completed, or None if that
+        isn't known and `is_challenge_completed` has to decide.
+        """
+        tracked = self.users.get(str(discord_id))
+        if (
+            tracked is None or
+            option_index >= len(tracked.descriptions) or
+            option_index in tracked.unknown or
+            (description is not None and tracked.descriptions[option_index] != description)
+        ):
+            return None
+        return option_index in tracked.completed
+
+    def stats(self):
+        return {
+            "users": len(self.users),
+            "max_users": self.max_users,
+            "planned": self.planned,
+            "skipped": self.skipped,
+            "untracked": self.untracked,
+        }
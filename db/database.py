@@ -9,6 +9,7 @@ class Database:
 
         MONGO_URI = os.getenv("MONGO_URI")
         self.client = AsyncIOMotorClient(MONGO_URI)
+        self._supports_transactions = None
         self._instance = None
 
     @classmethod
@@ -21,3 +22,15 @@ class Database:
         db = self.client.get_database(database_name)
 
         return db.get_collection(collection_name)
+
+    async def supports_transactions(self) -> bool:
+        """
+        Check whether the server is a replica set member or mongos, which is
+        required for multi-document transactions. A standalone server (e.g.
+        `make mongodb`) doesn't support them.
+        """
+        if self._supports_transactions is None:
+            hello = await self.client.admin.command("hello")
+            self._supports_transactions = bool(
+                hello.get("setName") or hello.get("msg") == "isdbgrid")
+        return self._supports_transactions
@@ -0,0 +1,107 @@
+"""
+# Harvest unit of work.
+# ---
+# A harvest changes the farm, the user's inventory and stats, and their
+# challenge progress. On a replica set all of those writes are committed in
+# one transaction, so a harvest is never half applied.
+"""
+from typing import Dict, Optional, Tuple
+
+from db.database import Database
+from db.user_cache import UserCache
+from models.farm import COLLECTION_NAME as FARMS_COLLECTION_NAME
+from models.farm import FarmModel
+from models.user import UserModel
+from models.yieldmodel import YieldModel
+
+
+class HarvestConflict(Exception):
+    """
+    The farm was changed elsewhere after it was loaded.
+    """
+
+
+def harvest_stats(harvest_yield: Dict[str, YieldModel], xp_earned: int) -> Dict[str, int]:
+    return {
+        "xp": xp_earned,
+        "harvest.xp": xp_earned,
+        "harvest.count": 1,
+        **{
+            f"harvest.{item_key}": yield_.amount
+            for item_key, yield_ in harvest_yield.items()
+        }
+    }
+
+
+async def _write_harvest(farm: FarmModel, harvest_yield, xp_earned, session=None):
+    write = farm.pending_plot_write()
+    # Items are only credited for plots whose change is written, otherwise
+    # the same yields could be paid out again on the next harvest
+    if not write:
+        return
+
+    query, update, upsert = write
+    collection = Database.get_instance().get_collection(FARMS_COLLECTION_NAME)
+    result = await collection.update_one(
+        query, update, upsert=upsert, session=session)
+    if result.matched_count == 0 and not upsert:
+        raise HarvestConflict()
+
+    if not any(harvest_yield.values()) and not xp_earned:
+        return
+
+    await UserModel.give_items(
+        farm.discord_id, harvest_yield, 0, harvest_stats(harvest_yield, xp_earned), session=session)
+    await UserModel.increment_challenges_progress(farm.discord_id, [
+        ("harvest", "count", 1),
+        *(("harvest", item_key, yield_.amount) for item_key, yield_ in harvest_yield.items())
+    ], session=session)
+
+
+async def harvest_farm(farm: FarmModel, seed: Optional[int] = None) -> Optional[Tuple[Dict[str, YieldModel], int]]:
+    """
+    Harvest a farm and save the farm, the harvested items, stats and
+    challenge progress together. On a replica set this is one transaction
+    that is retried on transient errors. A standalone server doesn't support
+    transactions, so there the writes are made one after the other, farm
+    first, and the items are only given if the farm was saved.
+
+    :param farm: The farm to harvest, it is harvested in place.
+    :param seed: Seed for the yield draws, see `FarmModel.harvest`.
+    :return: A tuple containing the yields and xp earned, or None if the farm
+    was changed elsewhere and nothing was saved.
+    """
+    # The farm is harvested in place, put it back if nothing is saved so a
+    # later save can't write the harvest without its items
+    plot = {plot_id: plot_item.model_copy(deep=True) for plot_id, plot_item in farm.plot.items()}
+    dirty_plots = set(farm._dirty_plots)
+
+    (harvest_yield, xp_earned) = farm.harvest(seed)
+    if not farm.pending_plot_write():
+        # Nothing was harvested, so there is nothing to credit
+        return ({}, 0)
+
+    database = Database.get_instance()
+    try:
+        if await database.supports_transactions():
+            async with await database.client.start_session() as session:
+                async def _callback(session):
+                    await _write_harvest(farm, harvest_yield, xp_earned, session)
+
+                # Retries on TransientTransactionError and unknown commit results
+                await session.with_transaction(_callback)
+        else:
+            await _write_harvest(farm, harvest_yield, xp_earned)
+    except HarvestConflict:
+        farm.plot = plot
+        farm._dirty_plots = dirty_plots
+        return None
+    except BaseException:
+        farm.plot = plot
+        farm._dirty_plots = dirty_plots
+        raise
+
+    # A read during the transaction may have cached the old user
+    UserCache.get_instance().invalidate(farm.discord_id)
+    farm.mark_plot_saved()
+    return (harvest_yield, xp_earned)
@@ -0,0 +1,95 @@
+"""
+# Index bootstrap and advisor.
+# ---
+# Every model module declares the indexes its queries need (`INDEXES`) and a
+# few representative queries (`QUERY_SHAPES`). `ensure_indexes` creates the
+# indexes on startup and `explain_query_shapes` checks that every query shape
+# is actually served by an index.
+"""
+import logging
+from typing import Any, Dict, List
+
+from pymongo.errors import OperationFailure
+
+from db import leaderboard
+from db.database import Database
+from models import challenges, farm, shop, user
+
+logger = logging.getLogger(__name__)
+
+# (collection name, indexes, query shapes)
+REGISTRY = [
+    (user.COLLECTION_NAME, user.INDEXES, user.QUERY_SHAPES),
+    (user.COLLECTION_NAME, leaderboard.INDEXES, leaderboard.QUERY_SHAPES),
+    (farm.COLLECTION_NAME, farm.INDEXES, farm.QUERY_SHAPES),
+    (challenges.COLLECTION_NAME, challenges.INDEXES, challenges.QUERY_SHAPES),
+    (shop.COLLECTION_NAME, shop.INDEXES, shop.QUERY_SHAPES),
+]
+
+
+async def ensure_indexes() -> List[str]:
+    """
+    Create every registered index that doesn't exist yet. An index that
+    can't be built (e.g. a unique index over duplicate values) is logged
+    and skipped so the bot still starts.
+
+    :return: The names of the indexes that failed.
+    """
+    database = Database.get_instance()
+    failed = []
+    for collection_name, indexes, _ in REGISTRY:
+        collection = database.get_collection(collection_name)
+        for index in indexes:
+            try:
+                await collection.create_indexes([index])
+            except OperationFailure as e:
+                name = f"{collection_name}.{index.document['name']}"
+                logger.error(f"Failed to create index {name}: {e}")
+                failed.append(name)
+
+    return failed
+
+
+def _plan_stages(plan: Any) -> List[str]:
+    """
+    Collect the stage names in an explain plan, depth first.
+    """
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+async def explain_query_shapes() -> List[Dict[str, Any]]:
+    """
+    Explain every registered query shape and report how it is executed.
+
+    :return: A row per query shape with its collection, name, plan stages,
+    documents examined and whether it scans the whole collection.
+    """
+    database = Database.get_instance()
+    report = []
+    for collection_name, _, shapes in REGISTRY:
+        collection = database.get_collection(collection_name)
+        for shape in shapes:
+            cursor = collection.find(shape["filter"])
+            if shape.get("sort"):
+                cursor = cursor.sort(shape["sort"])
+
+            explain = await cursor.explain()
+            stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan"))
+            report.append({
+                "collection": collection_name,
+                "name": shape["name"],
+                "stages": stages,
+                "docs_examined": explain.get("executionStats", {}).get("totalDocsExamined"),
+                "collscan": "COLLSCAN" in stages,
+            })
+
+    return report
@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from db.database import Database
+
+# Leaderboard name -> the user field it ranks by
+BOARDS = {
+    "xp": "stats.xp",
+    "balance": "balance",
+    "harvests": "stats.harvest.count",
+}
+
+# Indexes on the users collection
+INDEXES = [
+    index
+    for field in BOARDS.values()
+    for index in (
+        IndexModel([(field, DESCENDING)]),
+        IndexModel([("guild_ids", ASCENDING), (field, DESCENDING)]),
+    )
+]
+
+# Representative queries, checked by `db.indexes.explain_query_shapes`
+QUERY_SHAPES = [
+    shape
+    for board, field in BOARDS.items()
+    for shape in (
+        {"name": f"{board} top", "filter": {field: {"$gt": 0}}, "sort": [(field, DESCENDING)]},
+        {"name": f"{board} guild top", "filter": {"guild_ids": "0", field: {"$gt": 0}}, "sort": [(field, DESCENDING)]},
+    )
+]
+
+DEFAULT_TOP_N = 100
+DEFAULT_TOP_TTL_SECONDS = 60.0
+DEFAULT_RANK_TTL_SECONDS = 300.0
+
+logger = logging.getLogger(__name__)
+
+
+class Leaderboard:
+    """
+    Serves leaderboards from the `users` collection without sorting it on
+    every request.
+
+    - The top `top_n` users of each board (globally and per guild) are read
+      through a (field desc) or (guild_ids, field desc) index and cached for
+      `LEADERBOARD_TOP_TTL` seconds.
+    - Global ranks are looked up with a binary search in a sorted snapshot of
+      every score on the board, built with a covered index scan. Once a
+      snapshot is older than `LEADERBOARD_RANK_TTL` seconds it is rebuilt in
+      the background while requests keep using it, so only a board's very
+      first rank waits for the scan (see `warm`). Guild ranks count through
+      the compound index instead, guilds are small.
+
+    A rebuild reads one number per ranked user from the index only (about
+    8 MB and well under a second per million users) and only happens when
+    a board is ranked after its snapshot expired, so an idle board is never
+    rescanned. That is cheaper than keeping a sorted array in sync with
+    every score change, which would have to hear about every `$inc` to xp,
+    balance and harvests.
+    """
+
+    def __init__(
+        self,
+        top_n: Optional[int] = None,
+        top_ttl: Optional[float] = None,
+        rank_ttl: Optional[float] = None,
+        collection_name: str = "users",
+        database_name: str = "dafarmz"
+    ):
+        if top_n is None:
+            top_n = int(os.getenv("LEADERBOARD_TOP_N", DEFAULT_TOP_N))
+        if top_ttl is None:
+            top_ttl = float(os.getenv("LEADERBOARD_TOP_TTL", DEFAULT_TOP_TTL_SECONDS))
+        if rank_ttl is None:
+            rank_ttl = float(os.getenv("LEADERBOARD_RANK_TTL", DEFAULT_RANK_TTL_SECONDS))
+
+        self.top_n = top_n
+        self.top_ttl = top_ttl
+        self.rank_ttl = rank_ttl
+        self.collection_name = collection_name
+        self.database_name = database_name
+
+        # (board, guild id or None) -> (expires at, [(discord id, score)])
+        self.tops: Dict[Tuple[str, Optional[str]], Tuple[float, List[Tuple[str, float]]]] = {}
+        # board -> (expires at, ascending scores of every ranked user)
+        self.scores: Dict[str, Tuple[float, np.ndarray]] = {}
+        # board -> the snapshot being built
+        self.loading: Dict[str, asyncio.Task] = {}
+        self.top_refreshes = 0
+        self.rank_refreshes = 0
+        self._instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if not hasattr(cls, "_instance"):
+            cls._instance = cls()
+        return cls._instance
+
+    def _collection(self):
+        return Database.get_instance().get_collection(
+            self.collection_name, self.database_name)
+
+    async def ensure_indexes(self):
+        await self._collection().create_indexes(INDEXES)
+
+    async def top(self, board: str, guild_id=None) -> List[Tuple[str, float]]:
+        """
+        Get the top `top_n` users of a board.
+
+        :param board: One of `BOARDS`.
+        :param guild_id: Only rank members of this guild, or None for global.
+        :return: (discord id, score) tuples, best first.
+        """
+        key = (board, str(guild_id) if guild_id else None)
+        cached = self.tops.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        field = BOARDS[board]
+        query = {field: {"$gt": 0}}
+        if guild_id:
+            query["guild_ids"] = str(guild_id)
+
+        cursor = self._collection().find(
+            query, {"_id": 0, "discord_id": 1, field: 1}
+        ).sort(field, DESCENDING).limit(self.top_n)
+
+        top = [(doc["discord_id"], _get_path(doc, field)) async for doc in cursor]
+        self.tops[key] = (time.monotonic() + self.top_ttl, top)
+        self.top_refreshes += 1
+        return top
+
+    def record(self, board: str, discord_id, score: float, guild_ids=()):
+        """
+        Fold a user's current score into the cached top lists they belong
+        to, so they see their own progress before the next refresh.
+
+        :param board: One of `BOARDS`.
+        :param discord_id: The discord ID of the user.
+        :param score: Their current score.
+        :param guild_ids: The guilds they are a member of.
+        """
+        discord_id = str(discord_id)
+        for (top_board, guild_id), (expires_at, top) in list(self.tops.items()):
+            if top_board != board or (guild_id and guild_id not in guild_ids):
+                continue
+
+            entries = [entry for entry in top if entry[0] != discord_id]
+            if score > 0 and (len(entries) < self.top_n or score > entries[-1][1]):
+                entries.append((discord_id, score))
+                entries.sort(key=lambda entry: entry[1], reverse=True)
+            self.tops[(top_board, guild_id)] = (expires_at, entries[:self.top_n])
+
+    def warm(self):
+        """
+        Start building the score snapshot of every board, so the first ranks
+        don't have to wait for it. Call this after `ensure_indexes`, the
+        snapshots are read from the leaderboard indexes.
+        """
+        for board in BOARDS:
+            self._load_scores(board)
+
+    def _load_scores(self, board: str) -> asyncio.Task:
+        task = self.loading.get(board)
+        if task is None or task.done():
+            task = asyncio.create_task(self._scan_scores(board))
+            task.add_done_callback(_log_failure)
+            self.loading[board] = task
+        return task
+
+    async def _board_scores(self, board: str) -> np.ndarray:
+        cached = self.scores.get(board)
+        if cached:
+            if cached[0] <= time.monotonic():
+                self._load_scores(board)
+            return cached[1]
+
+        return await asyncio.shield(self._load_scores(board))
+
+    async def _read_scores(self, field: str, hint: bool) -> np.ndarray:
+        cursor = self._collection().find(
+            {field: {"$gt": 0}}, {"_id": 0, field: 1}
+        ).sort(field, DESCENDING).batch_size(10000)
+        if hint:
+            cursor = cursor.hint([(field, DESCENDING)])
+        else:
+            cursor = cursor.allow_disk_use(True)
+
+        return np.array(
+            [_get_path(doc, field) async for doc in cursor], dtype=np.float64)[::-1]
+
+    async def _scan_scores(self, board: str) -> np.ndarray:
+        field = BOARDS[board]
+        try:
+            # Covered by the (field desc) index, no documents are fetched
+            scores = await self._read_scores(field, hint=True)
+        except OperationFailure as e:
+            # The index is missing (e.g. dropped or still being built)
+            logger.warning(f"Scanning {board} scores without their index: {e}")
+            scores = await self._read_scores(field, hint=False)
+
+        self.scores[board] = (time.monotonic() + self.rank_ttl, scores)
+        self.rank_refreshes += 1
+        return scores
+
+    async def rank(self, board: str, score: float, guild_id=None) -> int:
+        """
+        Get the rank a score has on a board, 1 being the best. Ties share a
+        rank.
+
+        :param board: One of `BOARDS`.
+        :param score: The score to rank, usually the user's current score.
+        :param guild_id: Only rank against members of this guild.
+        :return: The rank of the score.
+        """
+        if guild_id:
+            better = await self._collection().count_documents({
+                "guild_ids": str(guild_id),
+                BOARDS[board]: {"$gt": score},
+            })
+            return better + 1
+
+        scores = await self._board_scores(board)
+        better = len(scores) - int(np.searchsorted(scores, score, side="right"))
+        return better + 1
+
+    def invalidate(self):
+        self.tops.clear()
+        self.scores.clear()
+
+    def stats(self):
+        return {
+            "cached_tops": len(self.tops),
+            "ranked_boards": {board: len(scores) for board, (_, scores) in self.scores.items()},
+            "top_refreshes": self.top_refreshes,
+            "rank_refreshes": self.rank_refreshes,
+        }
+
+
+def _log_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        logger.error(f"Failed to load leaderboard scores: {task.exception()}")
+
+
+def get_score(doc, board: str):
+    """
+    Get a user's score on a board from their document (or `model_dump()`).
+    """
+    return _get_path(doc, BOARDS[board])
+
+
+def _get_path(doc, path: str):
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return 0
+        doc = doc.get(part)
+    return doc or 0
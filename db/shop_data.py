@@ -1,12 +1,20 @@
-from typing import List
+from typing import Dict, List, Optional
 
 from models.shop import ShopModel
 
 
+def shop_key(plot_key: str) -> str:
+    """
+    Get the shop key of what is planted in a plot (plant:apple -> seed:apple).
+    """
+    return plot_key.replace("plant:", "seed:", 1)
+
+
 class ShopData:
     def __init__(self):
         self.buyable_data = []
         self.all_shop_data = []
+        self.items_by_key: Dict[str, ShopModel] = {}
         self._instance = None
 
     @classmethod
@@ -17,6 +25,20 @@ class ShopData:
     def all(cls) -> List[ShopModel]:
         return cls.get_instance().all_shop_data
 
+    @classmethod
+    def get(cls, key: str) -> Optional[ShopModel]:
+        """
+        Look up a shop item by key (e.g. "seed:apple").
+        """
+        return cls.get_instance().items_by_key.get(key)
+
+    @classmethod
+    def set_data(cls, all_items: List[ShopModel], buyable_items: List[ShopModel]):
+        instance = cls.get_instance()
+        instance.all_shop_data = all_items
+        instance.buyable_data = buyable_items
+        instance.items_by_key = {item.key: item for item in all_items}
+
     @classmethod
     def get_instance(cls):
         if not hasattr(cls, "_instance"):
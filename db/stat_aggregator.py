@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Iterable, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from db.database import Database
+from db.user_cache import UserCache
+
+DEFAULT_FLUSH_MS = 1000
+DEFAULT_FLUSH_OPS = 500
+DEFAULT_MAX_USERS = 5000
+DEFAULT_MAX_RETAINED_USERS = 50000
+
+logger = logging.getLogger(__name__)
+
+
+def _apply(stats: Dict[str, Any], path: str, amount):
+    """
+    Add `amount` to a dotted stat path (e.g. "plant.count") in a nested
+    stats dict, the same way `$inc` on `stats.<path>` would.
+    """
+    *parents, leaf = path.split(".")
+    for parent in parents:
+        child = stats.get(parent)
+        if not isinstance(child, dict):
+            child = {}
+            stats[parent] = child
+        stats = child
+    stats[leaf] = (stats.get(leaf) or 0) + amount
+
+
+class StatAggregator:
+    """
+    Write-behind buffer for user stat increments. Increments are summed per
+    user in memory and written with one `bulk_write` every `flush_ms`
+    milliseconds, or sooner once `flush_ops` increments or `max_users`
+    users are pending. Reads overlay the pending increments (see `overlay`)
+    so they never see stats going backwards. Each flush also sets
+    `stats_flush` on the users it writes, which tells reads made during a
+    flush whether they already include it.
+
+    Increments that fail to write are kept for the next flush, for at most
+    `max_retained_users` users, the rest are dropped and logged.
+
+    Configured with the `STATS_FLUSH_MS`, `STATS_FLUSH_OPS`,
+    `STATS_MAX_USERS` and `STATS_MAX_RETAINED_USERS` environment variables.
+    `STATS_FLUSH_MS=0` writes every increment straight away.
+    """
+
+    def __init__(
+        self,
+        flush_ms: Optional[int] = None,
+        flush_ops: Optional[int] = None,
+        max_users: Optional[int] = None,
+        max_retained_users: Optional[int] = None,
+        collection_name: str = "users"
+    ):
+        if flush_ms is None:
+            flush_ms = int(os.getenv("STATS_FLUSH_MS", DEFAULT_FLUSH_MS))
+        if flush_ops is None:
+            flush_ops = int(os.getenv("STATS_FLUSH_OPS", DEFAULT_FLUSH_OPS))
+        if max_users is None:
+            max_users = int(os.getenv("STATS_MAX_USERS", DEFAULT_MAX_USERS))
+        if max_retained_users is None:
+            max_retained_users = int(os.getenv("STATS_MAX_RETAINED_USERS", DEFAULT_MAX_RETAINED_USERS))
+
+        self.flush_ms = flush_ms
+        self.flush_ops = flush_ops
+        self.max_users = max_users
+        self.max_retained_users = max_retained_users
+        self.collection_name = collection_name
+
+        # discord id -> dotted stat path -> pending increment
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        # Increments being written by the current flush, and its id
+        self.flushing: Dict[str, Dict[str, Any]] = {}
+        self.flush_id: Optional[ObjectId] = None
+        self.pending_ops = 0
+        self.ops = 0
+        self.flushes = 0
+        self.writes = 0
+        self.failed_flushes = 0
+        self.dropped_users = 0
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if not hasattr(cls, "_instance"):
+            cls._instance = cls()
+        return cls._instance
+
+    async def add(self, discord_id, stats: Dict[str, Any]):
+        """
+        Queue stat increments for a user.
+
+        :param discord_id: The discord ID of the user.
+        :param stats: Dotted stat paths (relative to `stats`) and amounts.
+        """
+        if self.flush_ms <= 0 or self._stopping:
+            self._merge(str(discord_id), stats)
+            await self.flush()
+            return
+
+        self._merge(str(discord_id), stats)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+        if self.pending_ops >= self.flush_ops or len(self.pending) >= self.max_users:
+            self._wakeup.set()
+
+    def _merge(self, discord_id: str, stats: Dict[str, Any], count=True):
+        pending = self.pending.setdefault(discord_id, {})
+        for stat, amount in stats.items():
+            pending[stat] = pending.get(stat, 0) + amount
+        if count:
+            self.pending_ops += 1
+            self.ops += 1
+
+    def pending_for(self, discord_id, stats_flush: Optional[ObjectId] = None) -> Dict[str, Any]:
+        """
+        Get the increments for a user that haven't been written yet.
+
+        :param discord_id: The discord ID of the user.
+        :param stats_flush: The `stats_flush` of the user as read. If it is
+        the flush in progress, that flush is already included.
+        """
+        discord_id = str(discord_id)
+        pending = {}
+        if self.flush_id is None or stats_flush != self.flush_id:
+            pending.update(self.flushing.get(discord_id, {}))
+        for stat, amount in self.pending.get(discord_id, {}).items():
+            pending[stat] = pending.get(stat, 0) + amount
+        return pending
+
+    def overlay(self, user, fields: Optional[Iterable[str]] = None):
+        """
+        Add a user's pending increments to their loaded stats in place.
+
+        :param user: A loaded `UserModel`.
+        :param fields: The fields a partial user was loaded with, stats
+        outside of them are skipped.
+        """
+        pending = self.pending_for(user.discord_id, user.stats_flush)
+        if not pending:
+            return user
+
+        prefixes = None
+        if fields is not None:
+            prefixes = [f[len("stats"):].lstrip(".") for f in fields if f == "stats" or f.startswith("stats.")]
+
+        for path, amount in pending.items():
+            if prefixes is None or any(
+                not prefix or path == prefix or path.startswith(prefix + ".")
+                for prefix in prefixes
+            ):
+                _apply(user.stats, path, amount)
+
+        return user
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """
+        Write every pending increment in one `bulk_write`. Increments that
+        fail to write are kept for the next flush, up to
+        `max_retained_users` users.
+        """
+        async with self._flush_lock:
+            if not self.pending:
+                return
+
+            pending, self.pending = self.pending, {}
+            self.pending_ops = 0
+            self.flushing = pending
+            self.flush_id = ObjectId()
+
+            collection = Database.get_instance().get_collection(self.collection_name)
+            try:
+                await collection.bulk_write([
+                    UpdateOne(
+                        {"discord_id": discord_id},
+                        {
+                            "$inc": {f"stats.{stat}": amount for stat, amount in stats.items()},
+                            "$set": {"stats_flush": self.flush_id},
+                        }
+                    )
+                    for discord_id, stats in pending.items()
+                ], ordered=False)
+            except Exception as e:
+                self.failed_flushes += 1
+                logger.error(f"Failed to flush stats for {len(pending)} users: {e}")
+                self._retain(pending)
+                return
+            finally:
+                self.flushing = {}
+                self.flush_id = None
+
+            self.flushes += 1
+            self.writes += len(pending)
+
+            # Cached users were loaded before these increments were written
+            cache = UserCache.get_instance()
+            for discord_id in pending:
+                cache.invalidate(discord_id)
+
+    def _retain(self, failed: Dict[str, Dict[str, Any]]):
+        """
+        Keep increments that failed to write along with the ones added since,
+        dropping failed users past `max_retained_users`.
+        """
+        newer, self.pending = self.pending, {}
+        room = self.max_retained_users - len(newer)
+        dropped = 0
+        for discord_id, stats in failed.items():
+            if discord_id not in newer:
+                if room <= 0:
+                    dropped += 1
+                    continue
+                room -= 1
+            self._merge(discord_id, stats, count=False)
+
+        for discord_id, stats in newer.items():
+            self._merge(discord_id, stats, count=False)
+
+        if dropped:
+            self.dropped_users += dropped
+            logger.error(f"Dropped unwritten stats for {dropped} users, too many are pending")
+
+    async def stop(self):
+        """
+        Stop the background flusher and write anything still pending. A
+        flush in progress is finished rather than cancelled, so its batch
+        isn't lost.
+        """
+        self._stopping = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+        # Waits for the flush lock, then writes what was added meanwhile
+        await self.flush()
+
+    def stats(self):
+        return {
+            "pending_users": len(self.pending),
+            "pending_ops": self.pending_ops,
+            "ops": self.ops,
+            "flushes": self.flushes,
+            "writes": self.writes,
+            "failed_flushes": self.failed_flushes,
+            "dropped_users": self.dropped_users,
+            "ops_per_write": self.ops / self.writes if self.writes else 0.0,
+        }
@@ -0,0 +1,140 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from pydantic import BaseModel
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 30.0
+
+
+class UserCache:
+    """
+    A per-process TTL + LRU cache of loaded users keyed by discord id. Size
+    and time to live can be configured with the `USER_CACHE_SIZE` and
+    `USER_CACHE_TTL` environment variables.
+
+    Entries are copied on the way in and out, so callers are free to modify
+    the models they get. Writes from other processes are only seen once the
+    entry expires.
+
+    A read that overlaps a write could finish after the write invalidated
+    the entry and cache the old document. So callers capture `generation`
+    before going to the database and pass it to `put`, which drops the
+    entry if the user was invalidated or cached by anyone else since.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        if max_entries is None:
+            max_entries = int(os.getenv("USER_CACHE_SIZE", DEFAULT_MAX_ENTRIES))
+        if ttl is None:
+            ttl = float(os.getenv("USER_CACHE_TTL", DEFAULT_TTL_SECONDS))
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict[str, Tuple[float, BaseModel]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+        # Bumped on every put and invalidation
+        self.clock = 0
+        # discord id -> clock of its last put or invalidation, for the most
+        # recently changed users
+        self.changed_at: OrderedDict[str, int] = OrderedDict()
+        self.max_changed = max(4 * max_entries, 4096)
+        # The newest clock dropped from `changed_at`, users that aren't in it
+        # are treated as changed then
+        self.forgotten_at = 0
+        self._instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if not hasattr(cls, "_instance"):
+            cls._instance = cls()
+        return cls._instance
+
+    def get(self, discord_id) -> Optional[BaseModel]:
+        key = str(discord_id)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, model = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return model.model_copy(deep=True)
+
+    def generation(self, discord_id) -> int:
+        """
+        Capture this before reading or writing a user, then pass it to
+        `put` with the document that came back.
+        """
+        return self.clock
+
+    def _touch(self, key: str):
+        self.clock += 1
+        self.changed_at.pop(key, None)
+        self.changed_at[key] = self.clock
+        while len(self.changed_at) > self.max_changed:
+            _, changed_at = self.changed_at.popitem(last=False)
+            self.forgotten_at = max(self.forgotten_at, changed_at)
+
+    def put(self, discord_id, model: BaseModel, generation: int):
+        """
+        Cache a user read or written since `generation`. If the user changed
+        since then, whoever changed it may have a newer document, so the
+        user isn't cached at all.
+        """
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+
+        key = str(discord_id)
+        changed_at = self.changed_at.get(key, self.forgotten_at)
+        self._touch(key)
+        if changed_at > generation:
+            self.entries.pop(key, None)
+            self.stale_puts += 1
+            return
+
+        self.entries.pop(key, None)
+        self.entries[key] = (time.monotonic() + self.ttl, model.model_copy(deep=True))
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, discord_id):
+        key = str(discord_id)
+        self._touch(key)
+        if self.entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "stale_puts": self.stale_puts,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
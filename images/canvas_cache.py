@@ -0,0 +1,135 @@
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from images.compositing import paste_sprites
+from images.merge import generate_layout_image, plot_id_to_grid
+from images.sprite_atlas import Sprite, SpriteAtlas
+from utils.plant_state import IMAGE_YIELD_MAP
+
+DEFAULT_MAX_FARMS = 256
+
+Box = Tuple[int, int, int, int]
+
+
+def _sprite_box(sprite: Sprite, plot_id: str) -> Box:
+    x, y = sprite.position(*plot_id_to_grid(plot_id))
+    return (x, y, x + sprite.image.width, y + sprite.image.height)
+
+
+def _intersects(a: Box, b: Box) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _union(a: Box, b: Box) -> Box:
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+class FarmCanvas:
+    """
+    The last composited image of a farm along with the sprite drawn in each
+    plot, so the next render only has to redraw what changed.
+    """
+    __slots__ = ("image", "cells")
+
+    def __init__(self, image: Image.Image, cells: Dict[str, str]):
+        self.image = image
+        self.cells = cells
+
+
+class FarmCanvasCache:
+    """
+    An LRU of per-farm canvases. Renders of a cached farm restore the base
+    background under the plots whose sprite changed and redraw only the
+    sprites overlapping those plots.
+
+    The number of farms kept is configured with the
+    `RENDER_CANVAS_CACHE_SIZE` environment variable.
+    """
+
+    def __init__(self, max_farms: Optional[int] = None):
+        if max_farms is None:
+            max_farms = int(os.getenv(
+                "RENDER_CANVAS_CACHE_SIZE", DEFAULT_MAX_FARMS))
+
+        self.max_farms = max_farms
+        self.canvases: OrderedDict[str, FarmCanvas] = OrderedDict()
+        self.base_tiles: Dict[Box, Image.Image] = {}
+        self._instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if not hasattr(cls, "_instance"):
+            cls._instance = cls()
+        return cls._instance
+
+    def render(self, farm_id: str, layout: List[Tuple[str, str, int]]) -> Tuple[Image.Image, int]:
+        """
+        Render a farm, reusing its previous canvas when possible.
+
+        :param farm_id: A stable identifier for the farm (e.g. discord id).
+        :param layout: The layout from `get_plot_layout`.
+        :return: A tuple of the rendered image and the number of plots that
+        were redrawn, or -1 if the whole farm was rendered.
+        """
+        cells = {
+            plot_id: IMAGE_YIELD_MAP[key][stage]
+            for plot_id, key, stage in layout
+        }
+
+        canvas = self.canvases.get(farm_id)
+        if canvas is None:
+            image = generate_layout_image(layout)
+            self._put(farm_id, FarmCanvas(image, cells))
+            return (image, -1)
+
+        self.canvases.move_to_end(farm_id)
+
+        dirty = [
+            plot_id for plot_id in cells.keys() | canvas.cells.keys()
+            if cells.get(plot_id) != canvas.cells.get(plot_id)
+        ]
+        if dirty:
+            self._redraw(canvas, cells, dirty)
+            canvas.cells = cells
+
+        return (canvas.image, len(dirty))
+
+    def _redraw(self, canvas: FarmCanvas, cells: Dict[str, str], dirty: List[str]):
+        atlas = SpriteAtlas.get_instance()
+        placed = []
+        for plot_id, name in cells.items():
+            sprite = atlas.get(name)
+            placed.append((sprite, _sprite_box(sprite, plot_id)))
+
+        for plot_id in dirty:
+            boxes = [
+                _sprite_box(atlas.get(name), plot_id)
+                for name in (canvas.cells.get(plot_id), cells.get(plot_id))
+                if name
+            ]
+            region = boxes[0] if len(boxes) == 1 else _union(*boxes)
+
+            # Rebuild the region from the base and every sprite touching it,
+            # in draw order, so overlapping neighbours are kept intact.
+            tile = paste_sprites(self._base_tile(region).copy(), [
+                (sprite, (box[0] - region[0], box[1] - region[1]))
+                for sprite, box in placed
+                if _intersects(box, region)
+            ])
+
+            canvas.image.paste(tile, region[:2])
+
+    def _base_tile(self, box: Box) -> Image.Image:
+        tile = self.base_tiles.get(box)
+        if tile is None:
+            tile = SpriteAtlas.get_instance().get_base().crop(box)
+            self.base_tiles[box] = tile
+        return tile
+
+    def _put(self, farm_id: str, canvas: FarmCanvas):
+        self.canvases[farm_id] = canvas
+        while len(self.canvases) > self.max_farms:
+            self.canvases.popitem(last=False)
@@ -0,0 +1,110 @@
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from images.sprite_atlas import Sprite
+
+ENGINES = ["pillow", "numpy"]
+RENDER_ENGINE = os.getenv("RENDER_ENGINE", "pillow")
+
+# A sprite and the top-left corner it is pasted at
+Placement = Tuple[Sprite, Tuple[int, int]]
+
+_sprite_pixels: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def paste_sprites_pillow(canvas: Image.Image, placements: List[Placement]) -> Image.Image:
+    for sprite, position in placements:
+        canvas.paste(sprite.image, position, sprite.image)
+    return canvas
+
+
+def _get_sprite_pixels(sprite: Sprite) -> Tuple[np.ndarray, np.ndarray]:
+    pixels = _sprite_pixels.get(sprite.name)
+    if pixels is None:
+        rgba = np.asarray(sprite.image, dtype=np.uint32)
+        pixels = (rgba, rgba[..., 3:])
+        _sprite_pixels[sprite.name] = pixels
+    return pixels
+
+
+def _overlaps(a: Placement, b: Placement) -> bool:
+    (sa, (ax, ay)), (sb, (bx, by)) = a, b
+    return (
+        ax < bx + sb.image.width and bx < ax + sa.image.width and
+        ay < by + sb.image.height and by < ay + sa.image.height
+    )
+
+
+def _waves(placements: List[Placement]) -> List[List[Placement]]:
+    """
+    Split placements into waves where no two sprites in a wave overlap and
+    any overlapping pair is painted in its original order.
+    """
+    wave_of = []
+    waves: List[List[Placement]] = []
+    for i, placement in enumerate(placements):
+        wave = 0
+        for j in range(i):
+            if wave_of[j] >= wave and _overlaps(placements[j], placement):
+                wave = wave_of[j] + 1
+        wave_of.append(wave)
+        if wave == len(waves):
+            waves.append([])
+        waves[wave].append(placement)
+    return waves
+
+
+def paste_sprites_numpy(canvas: Image.Image, placements: List[Placement]) -> Image.Image:
+    """
+    Paste sprites with the same arithmetic as Pillow's masked RGBA paste,
+    blending every plot that shares a sprite in one vectorized operation.
+    The output is byte-identical to `paste_sprites_pillow`.
+    """
+    if not placements:
+        return canvas
+
+    # Pad the canvas so sprites hanging off the edges don't need clipping
+    pad = max(max(s.image.size) for s, _ in placements)
+    width, height = canvas.size
+    pixels = np.zeros((height + 2 * pad, width + 2 * pad, 4), dtype=np.uint8)
+    pixels[pad:pad + height, pad:pad + width] = np.asarray(canvas)
+
+    for wave in _waves(placements):
+        groups: Dict[str, List[Placement]] = {}
+        for placement in wave:
+            groups.setdefault(placement[0].name, []).append(placement)
+
+        for group in groups.values():
+            sprite = group[0][0]
+            src, alpha = _get_sprite_pixels(sprite)
+            xs = np.array([x for _, (x, _) in group]) + pad
+            ys = np.array([y for _, (_, y) in group]) + pad
+
+            rows = ys[:, None, None] + np.arange(sprite.image.height)[None, :, None]
+            cols = xs[:, None, None] + np.arange(sprite.image.width)[None, None, :]
+
+            dst = pixels[rows, cols].astype(np.uint32)
+            blended = dst * (255 - alpha) + src * alpha + 128
+            pixels[rows, cols] = (((blended >> 8) + blended) >> 8).astype(np.uint8)
+
+    return Image.fromarray(
+        np.ascontiguousarray(pixels[pad:pad + height, pad:pad + width]))
+
+
+def paste_sprites(canvas: Image.Image, placements: List[Placement], engine: str = RENDER_ENGINE) -> Image.Image:
+    """
+    Paste sprites onto a canvas in order.
+
+    :param canvas: The RGBA image to paste onto. The pillow engine modifies it
+    in place, the numpy engine returns a new image.
+    :param placements: The sprites and positions to paste, in draw order.
+    :param engine: One of `ENGINES`, defaults to the `RENDER_ENGINE`
+    environment variable.
+    :return: The composited image.
+    """
+    if engine == "numpy":
+        return paste_sprites_numpy(canvas, placements)
+    return paste_sprites_pillow(canvas, placements)
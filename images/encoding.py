@@ -0,0 +1,133 @@
+import io
+import os
+from typing import Optional
+
+from PIL import Image
+
+from images.sprite_atlas import SpriteAtlas
+
+OUTPUT_FORMATS = ["png", "png-indexed", "webp"]
+DEFAULT_COMPRESS_LEVEL = 6
+
+# Palette index used for fully transparent pixels in indexed PNGs
+TRANSPARENT_INDEX = 255
+
+
+class OutputMode:
+    """
+    How rendered farms are encoded. Configured with the `RENDER_FORMAT`
+    (one of `OUTPUT_FORMATS`) and `RENDER_COMPRESS_LEVEL` (0-9) environment
+    variables.
+    """
+    __slots__ = ("format", "compress_level")
+
+    def __init__(self, format="png", compress_level=DEFAULT_COMPRESS_LEVEL):
+        if format not in OUTPUT_FORMATS:
+            raise ValueError(
+                f"Unknown render format {format}, expected one of {OUTPUT_FORMATS}")
+
+        self.format = format
+        self.compress_level = max(0, min(9, int(compress_level)))
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("RENDER_FORMAT", "png"),
+            os.getenv("RENDER_COMPRESS_LEVEL", DEFAULT_COMPRESS_LEVEL)
+        )
+
+    @property
+    def key(self):
+        return f"{self.format}/{self.compress_level}"
+
+    @property
+    def filename(self):
+        return "farm.webp" if self.format == "webp" else "farm.png"
+
+    def __repr__(self):
+        return f"OutputMode({self.key})"
+
+
+OUTPUT_MODE = OutputMode.from_env()
+
+
+def build_palette(atlas: SpriteAtlas) -> Image.Image:
+    """
+    Build a fixed palette from the colors of the base layer and every sprite
+    in the atlas. Pixel art only uses a handful of colors so this is usually
+    exact. If there are more than 255 colors they are reduced with a median
+    cut. Index `TRANSPARENT_INDEX` is kept free for transparency.
+
+    :param atlas: A loaded sprite atlas.
+    :return: A "P" mode image usable with `Image.quantize(palette=...)`.
+    """
+    counts = {}
+    images = [atlas.get_base()] + [s.image for s in atlas.sprites.values()]
+    for image in images:
+        for count, (r, g, b, a) in image.getcolors(maxcolors=1 << 24):
+            if a == 255:
+                counts[(r, g, b)] = counts.get((r, g, b), 0) + count
+
+    colors = sorted(counts, key=counts.get, reverse=True)
+    if len(colors) > TRANSPARENT_INDEX:
+        strip = Image.new("RGB", (len(colors), 1))
+        strip.putdata(colors)
+        reduced = strip.quantize(TRANSPARENT_INDEX, Image.Quantize.MEDIANCUT)
+        colors = [
+            tuple(reduced.getpalette()[i * 3:i * 3 + 3])
+            for i in range(TRANSPARENT_INDEX)
+        ]
+
+    # Pad with the most common color so no pixel is ever mapped to the
+    # transparent index by the nearest color search.
+    colors = colors or [(0, 0, 0)]
+    colors += [colors[0]] * (256 - len(colors))
+
+    palette = Image.new("P", (1, 1))
+    palette.putpalette([channel for color in colors for channel in color])
+    return palette
+
+
+_palette: Optional[Image.Image] = None
+
+
+def get_palette() -> Image.Image:
+    global _palette
+    if _palette is None:
+        _palette = build_palette(SpriteAtlas.get_instance())
+    return _palette
+
+
+def to_indexed(image: Image.Image) -> Image.Image:
+    indexed = image.convert("RGB").quantize(
+        palette=get_palette(), dither=Image.Dither.NONE)
+
+    alpha = image.getchannel("A")
+    if alpha.getextrema()[0] < 255:
+        transparent = alpha.point(lambda a: 255 if a == 0 else 0)
+        indexed.paste(TRANSPARENT_INDEX, mask=transparent)
+        indexed.info["transparency"] = TRANSPARENT_INDEX
+
+    return indexed
+
+
+def encode_image(image: Image.Image, mode: OutputMode = OUTPUT_MODE) -> bytes:
+    """
+    Encode a rendered farm.
+
+    :param image: The RGBA farm image.
+    :param mode: The output mode to encode with.
+    :return: The encoded image.
+    """
+    with io.BytesIO() as image_binary:
+        if mode.format == "webp":
+            image.save(image_binary, "WEBP", lossless=True,
+                       method=round(mode.compress_level * 6 / 9))
+        elif mode.format == "png-indexed":
+            to_indexed(image).save(image_binary, "PNG",
+                                   compress_level=mode.compress_level)
+        else:
+            image.save(image_binary, "PNG",
+                       compress_level=mode.compress_level)
+
+        return image_binary.getvalue()
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import os
+import time
+import zlib
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+from images.canvas_cache import FarmCanvasCache
+from images.encoding import OUTPUT_MODE, OutputMode, encode_image, get_palette
+from images.sprite_atlas import SpriteAtlas
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_QUEUE = 32
+# Callers defer their interaction first, this only bounds how long the user
+# waits for an image before the farm is shown without it
+DEFAULT_QUEUE_TIMEOUT_SECONDS = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker(mode: OutputMode):
+    SpriteAtlas.get_instance().load()
+    if mode.format == "png-indexed":
+        get_palette()
+
+
+def _warm_up():
+    pass
+
+
+def _render_in_worker(farm_id, layout, mode: OutputMode) -> Tuple[bytes, float, int]:
+    start = time.perf_counter()
+    image, redrawn = FarmCanvasCache.get_instance().render(farm_id, layout)
+    image_bytes = encode_image(image, mode)
+    return (image_bytes, time.perf_counter() - start, redrawn)
+
+
+class RenderQueueFull(Exception):
+    """
+    No render slot became free within the queue timeout.
+    """
+
+
+class RenderExecutor:
+    """
+    Renders farm images in worker processes so Pillow never blocks the event
+    loop. Each worker is its own single process pool and a farm is always
+    rendered by the same worker, which keeps that farm's canvas around for
+    incremental redraws. At most `max_queue` renders are submitted at once,
+    any further callers wait up to `queue_timeout` seconds for a free slot.
+    A worker that dies is replaced and the render retried, on another
+    worker if the replacement fails too.
+
+    Configured with the `RENDER_WORKERS`, `RENDER_MAX_QUEUE` and
+    `RENDER_QUEUE_TIMEOUT` environment variables. `RENDER_WORKERS=0` renders
+    in a single background thread instead.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None
+    ):
+        if workers is None:
+            workers = int(os.getenv("RENDER_WORKERS", DEFAULT_WORKERS))
+        if max_queue is None:
+            max_queue = int(os.getenv("RENDER_MAX_QUEUE", DEFAULT_MAX_QUEUE))
+        if queue_timeout is None:
+            queue_timeout = float(os.getenv("RENDER_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT_SECONDS))
+
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.pools: List[Executor] = []
+        self.slots = asyncio.Semaphore(max_queue)
+
+        self.waiting = 0
+        self.in_flight = 0
+        self.renders = 0
+        self.full_renders = 0
+        self.plots_redrawn = 0
+        self.render_time = 0.0
+        self.max_render_time = 0.0
+        self.wait_time = 0.0
+        self.queue_timeouts = 0
+        self.restarts = 0
+        self.fallbacks = 0
+        self._instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if not hasattr(cls, "_instance"):
+            cls._instance = cls()
+        return cls._instance
+
+    def _new_pool(self) -> Executor:
+        return ProcessPoolExecutor(
+            max_workers=1,
+            initializer=_init_worker,
+            initargs=(OUTPUT_MODE,)
+        )
+
+    def start(self):
+        """
+        Start the worker processes. This should be called before the bot
+        starts so workers are not forked from a running event loop. Process
+        pools only fork on their first task, so each one is given a no-op
+        task to wait for.
+        """
+        if self.pools:
+            return self
+
+        if self.workers > 0:
+            self.pools = [self._new_pool() for _ in range(self.workers)]
+            for pool in self.pools:
+                pool.submit(_warm_up).result()
+            logger.info(f"Started {self.workers} render workers")
+        else:
+            self.pools = [ThreadPoolExecutor(max_workers=1)]
+
+        return self
+
+    def _replace_pool(self, broken: Executor):
+        """
+        Replace a pool whose worker died. Renders that failed on the same
+        pool at the same time only replace it once.
+        """
+        if broken not in self.pools:
+            return
+
+        self.pools[self.pools.index(broken)] = self._new_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.restarts += 1
+        logger.warning("A render worker died, started a new one")
+
+    def shutdown(self):
+        for pool in self.pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.pools = []
+
+    async def render(
+        self,
+        farm_id: str,
+        layout: List[Tuple[str, str, int]],
+        mode: OutputMode = OUTPUT_MODE
+    ) -> bytes:
+        """
+        Render a plot layout to encoded image bytes.
+
+        :param farm_id: A stable identifier for the farm (e.g. discord id).
+        :param layout: The layout from `get_plot_layout`.
+        :param mode: The output mode to encode with.
+        :return: The encoded image.
+        """
+        self.start()
+        home = zlib.crc32(farm_id.encode()) % len(self.pools)
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.queue_timeouts += 1
+            raise RenderQueueFull(
+                f"No render slot was free after {self.queue_timeout}s")
+        finally:
+            self.waiting -= 1
+        self.wait_time += time.perf_counter() - queued_at
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            # Try the farm's own worker, then its replacement, then the other
+            # workers, so a farm never depends on a single process
+            attempts = [home, home] + [i for i in range(len(self.pools)) if i != home]
+            for attempt, index in enumerate(attempts):
+                pool = self.pools[index]
+                try:
+                    image_bytes, elapsed, redrawn = await loop.run_in_executor(
+                        pool, _render_in_worker, farm_id, layout, mode)
+                    break
+                except BrokenProcessPool:
+                    self._replace_pool(pool)
+                    if attempt == len(attempts) - 1:
+                        raise
+                    if attempts[attempt + 1] != home:
+                        self.fallbacks += 1
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+
+        self.renders += 1
+        if redrawn < 0:
+            self.full_renders += 1
+        else:
+            self.plots_redrawn += redrawn
+        self.render_time += elapsed
+        self.max_render_time = max(self.max_render_time, elapsed)
+
+        return image_bytes
+
+    @property
+    def queue_depth(self):
+        return self.waiting + self.in_flight
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue,
+            "renders": self.renders,
+            "full_renders": self.full_renders,
+            "plots_redrawn": self.plots_redrawn,
+            "avg_render_ms": 1000 * self.render_time / self.renders if self.renders else 0.0,
+            "max_render_ms": 1000 * self.max_render_time,
+            "avg_wait_ms": 1000 * self.wait_time / self.renders if self.renders else 0.0,
+            "queue_timeouts": self.queue_timeouts,
+            "restarts": self.restarts,
+            "fallbacks": self.fallbacks,
+        }
@@ -1,71 +1,74 @@
 import logging
+from typing import List, Tuple
 
 from PIL import Image
 
-from utils.plant_state import get_image_for_plot_item_state
-
-GRID_SIZE = 32
-PLOT_OFFSET = 29
+from images.compositing import paste_sprites
+from images.sprite_atlas import SpriteAtlas
+from utils.growth import compute_growth
+from utils.plant_state import IMAGE_YIELD_MAP
 
 logger = logging.getLogger(__name__)
 
 
-def place_object(base, object_image, grid_x, grid_y):
-    object = Image.open(object_image).convert("RGBA")
-    w = object.width
-    h = object.height
-    x = grid_x * GRID_SIZE + PLOT_OFFSET - w // 2
-    y = grid_y * GRID_SIZE + PLOT_OFFSET - h // 2
+def place_object(base, sprite_name, grid_x, grid_y):
+    sprite = SpriteAtlas.get_instance().get(sprite_name)
+    base.paste(sprite.image, sprite.position(grid_x, grid_y), sprite.image)
 
-    additional_offset = {x: GRID_SIZE // 2, y: GRID_SIZE // 2}
-    if h > GRID_SIZE:
-        additional_offset[y] -= h // 4
+    return base
 
-    base.paste(object, (
-        int(x + additional_offset[x]),
-        int(y + additional_offset[y])
-    ), object)
 
-    return base
+def generate_base_image() -> Image.Image:
+    return SpriteAtlas.get_instance().get_base().copy()
 
 
-def generate_base_image():
-    bl1 = Image.open("./images/files/base-1.png").convert("RGBA")
-    bl2 = Image.open("./images/files/base-2.png").convert("RGBA")
-    base = Image.new("RGBA", bl1.size)
-    base.paste(bl1, (0, 0), bl1)
-    base.paste(bl2, (0, 0), bl2)
-    return base
+def plot_id_to_grid(plot_id: str) -> Tuple[int, int]:
+    """
+    Convert a plot id (A1, B5, etc.) into grid coordinates.
 
+    :param plot_id: The plot id.
+    :return: A tuple of (grid_x, grid_y).
+    """
+    return (ord(plot_id[0]) - 64, int(plot_id[1:]))
 
-def generate_image(plot_state):
-    base_image = generate_base_image()
 
-    # plot_state is a dict (A1, A2, B5, etc.)
-    for plot_id, state in plot_state.items():
-        col, row = plot_id[0], plot_id[1:]
+def get_plot_layout(plot_state) -> List[Tuple[str, str, int]]:
+    """
+    Get the visible state of every plot in draw order. Plots are drawn top
+    to bottom, left to right so tall sprites overlap the row above them the
+    same way regardless of the order they were planted in.
+
+    :param plot_state: The farm's plot dict (A1, A2, B5, etc.)
+    :return: A list of (plot_id, key, stage) tuples.
+    """
+    growth = compute_growth(plot_state)
+
+    layout = []
+    for plot_id, key, stage in zip(growth.plot_ids, growth.keys, growth.stages.tolist()):
+        if key not in IMAGE_YIELD_MAP:
+            logger.error(f"Item {key} in {plot_id} does not have an image map")
+            continue
 
-        last_harvested_at = None
-        grow_time_hr = None
-        if state.data:
-            last_harvested_at = state.data.last_harvested_at
-            grow_time_hr = state.data.grow_time_hr
+        layout.append((plot_id, key, stage))
 
+    layout.sort(key=lambda cell: plot_id_to_grid(cell[0])[::-1])
+    return layout
+
+
+def generate_layout_image(layout: List[Tuple[str, str, int]]) -> Image.Image:
+    atlas = SpriteAtlas.get_instance()
+
+    placements = []
+    for plot_id, key, stage in layout:
         try:
-            item_image = get_image_for_plot_item_state(
-                state.key,
-                last_harvested_at,
-                grow_time_hr
-            )
-
-            if item_image:
-                base_image = place_object(
-                    base_image,
-                    f"./images/files/{item_image}",
-                    ord(col) - 64,
-                    int(row)
-                )
+            sprite = atlas.get(IMAGE_YIELD_MAP[key][stage])
+            placements.append(
+                (sprite, sprite.position(*plot_id_to_grid(plot_id))))
         except Exception as e:
             logger.error(f"Error placing object for {plot_id}: {e}")
 
-    return base_image
+    return paste_sprites(generate_base_image(), placements)
+
+
+def generate_image(plot_state):
+    return generate_layout_image(get_plot_layout(plot_state))
@@ -1,15 +1,48 @@
 import io
+from typing import List, Optional
 
 import discord
 
-from images.merge import generate_image
+from images.encoding import OUTPUT_MODE
+from images.executor import RenderExecutor, RenderQueueFull
+from images.merge import get_plot_layout
+from images.render_cache import RenderCache, fingerprint
 from models.farm import FarmModel
 
+FARM_IMAGE_FILENAME = OUTPUT_MODE.filename
+RENDER_BUSY_MESSAGE = "The farm renderer is busy, try again in a moment to see your farm."
 
-async def render_farm(farm: FarmModel):
-    image = generate_image(farm.plot)
-    with io.BytesIO() as image_binary:
-        image.save(image_binary, "PNG")
-        image_binary.seek(0)
-        file = discord.File(image_binary, filename="farm.png")
-        return file
+
+async def render_farm(farm: FarmModel) -> Optional[discord.File]:
+    """
+    Render a farm's image.
+
+    :return: The image, or None if the renderer is too busy to render it in
+    time (see `RenderQueueFull`).
+    """
+    layout = get_plot_layout(farm.plot)
+    cache = RenderCache.get_instance()
+    cache_key = f"{OUTPUT_MODE.key}:{fingerprint(layout)}"
+
+    image_bytes = cache.get(cache_key)
+    if image_bytes is None:
+        try:
+            image_bytes = await RenderExecutor.get_instance().render(
+                farm.discord_id, layout)
+        except RenderQueueFull:
+            return None
+        cache.put(cache_key, image_bytes)
+
+    return discord.File(io.BytesIO(image_bytes), filename=FARM_IMAGE_FILENAME)
+
+
+def farm_image_files(embed: discord.Embed, image: Optional[discord.File]) -> List[discord.File]:
+    """
+    Get the files to send with a farm embed. If the image couldn't be
+    rendered, the embed is sent without it and says why.
+    """
+    if image is None:
+        embed.set_image(url=None)
+        embed.set_footer(text=RENDER_BUSY_MESSAGE)
+        return []
+    return [image]
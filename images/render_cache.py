@@ -0,0 +1,88 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def fingerprint(layout: Iterable[Tuple[str, str, int]]) -> str:
+    """
+    Create a content address for a farm image from its visible state.
+
+    :param layout: (plot_id, key, stage) for every drawn plot, in draw order.
+    :return: A hex digest identifying the rendered image.
+    """
+    digest = hashlib.sha1()
+    for plot_id, key, stage in layout:
+        digest.update(f"{plot_id}={key}@{stage};".encode())
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """
+    A bounded LRU of encoded farm images keyed by `fingerprint`. The budget
+    is the total size of the stored images in bytes and can be configured
+    with the `RENDER_CACHE_MAX_BYTES` environment variable.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        if max_bytes is None:
+            max_bytes = int(os.getenv(
+                "RENDER_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[str, bytes] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if not hasattr(cls, "_instance"):
+            cls._instance = cls()
+        return cls._instance
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self.entries.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return data
+
+    def put(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+
+        self.entries[key] = data
+        self.size += len(data)
+
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
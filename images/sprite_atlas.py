@@ -0,0 +1,128 @@
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+from utils.plant_state import IMAGE_YIELD_MAP
+
+IMAGE_DIR = "./images/files"
+BASE_LAYERS = ["base-1.png", "base-2.png"]
+
+GRID_SIZE = 32
+PLOT_OFFSET = 29
+
+logger = logging.getLogger(__name__)
+
+
+class Sprite:
+    """
+    A decoded RGBA sprite ready to be pasted onto the farm. `offset` is the
+    position of the sprite relative to the top-left corner of its grid cell.
+    """
+    __slots__ = ("name", "image", "offset")
+
+    def __init__(self, name: str, image: Image.Image):
+        self.name = name
+        self.image = image
+
+        w, h = image.size
+        x = PLOT_OFFSET + GRID_SIZE // 2 - w // 2
+        y = PLOT_OFFSET + GRID_SIZE // 2 - h // 2
+        # Tall sprites (trees) are shifted up so their base sits in the plot
+        if h > GRID_SIZE:
+            y -= h // 4
+
+        self.offset = (x, y)
+
+    def position(self, grid_x: int, grid_y: int) -> Tuple[int, int]:
+        return (
+            grid_x * GRID_SIZE + self.offset[0],
+            grid_y * GRID_SIZE + self.offset[1]
+        )
+
+
+class SpriteAtlas:
+    """
+    Holds every farm sprite and the composited base layer, decoded once so
+    renders never touch the disk.
+    """
+
+    def __init__(self):
+        self.sprites: Dict[str, Sprite] = {}
+        self.base: Optional[Image.Image] = None
+        self.hits = 0
+        self.misses = 0
+        self._instance = None
+
+    @classmethod
+    def get_instance(cls):
+        if not hasattr(cls, "_instance"):
+            cls._instance = cls()
+        return cls._instance
+
+    def load(self, image_dir=IMAGE_DIR):
+        """
+        Decode the base layers and every sprite referenced by
+        `IMAGE_YIELD_MAP`.
+
+        :param image_dir: The directory containing the sprite files.
+        """
+        base = None
+        for layer_name in BASE_LAYERS:
+            layer = self._decode(image_dir, layer_name)
+            if base is None:
+                base = Image.new("RGBA", layer.size)
+            base.paste(layer, (0, 0), layer)
+        self.base = base
+
+        names = {
+            name for images in IMAGE_YIELD_MAP.values() for name in images
+        }
+        for name in sorted(names):
+            try:
+                self.sprites[name] = Sprite(
+                    name, self._decode(image_dir, name))
+            except OSError as e:
+                logger.error(f"Error loading sprite {name}: {e}")
+
+        logger.info(f"Loaded {len(self.sprites)} sprites into the atlas")
+        return self
+
+    def get_base(self) -> Image.Image:
+        if self.base is None:
+            self.load()
+        return self.base
+
+    def get(self, name: str) -> Sprite:
+        """
+        Get a sprite by file name. Sprites missing from the atlas are decoded
+        from disk once and kept for subsequent renders.
+
+        :param name: The file name of the sprite (e.g. "apple-0.png")
+        :return: The decoded sprite.
+        """
+        if self.base is None:
+            self.load()
+
+        sprite = self.sprites.get(name)
+        if sprite:
+            self.hits += 1
+            return sprite
+
+        self.misses += 1
+        sprite = Sprite(name, self._decode(IMAGE_DIR, name))
+        self.sprites[name] = sprite
+        return sprite
+
+    def stats(self):
+        return {
+            "sprites": len(self.sprites),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    @staticmethod
+    def _decode(image_dir, name) -> Image.Image:
+        with Image.open(os.path.join(image_dir, name)) as image:
+            return image.convert("RGBA")
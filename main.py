@@ -1,12 +1,23 @@
 import asyncio
 import logging
 import os
+import signal
 
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from api.fastapi import router
+from db.challenge_progress import ChallengeProgress
+from db.indexes import ensure_indexes, explain_query_shapes
+from db.leaderboard import Leaderboard
+from db.shop_data import ShopData
+from db.stat_aggregator import StatAggregator
+from db.user_cache import UserCache
+from images.executor import RenderExecutor
+from images.render_cache import RenderCache
+from images.sprite_atlas import SpriteAtlas
+from models.farm import FarmModel
 
 load_dotenv()
 
@@ -28,15 +39,27 @@ class DaFarmz(commands.Bot):
             activity=discord.Activity(
                 type=discord.ActivityType.watching, name="the farm"),
         )
+        self.indexes_ensured = False
 
     async def on_connect(self):
         await self.sync_commands()
 
+    async def close(self):
+        await StatAggregator.get_instance().stop()
+        RenderExecutor.get_instance().shutdown()
+        await super().close()
+
     async def on_ready(self):
         logger.info(
             f"{self.user} is ready..."
         )
 
+        if not self.indexes_ensured:
+            self.indexes_ensured = True
+            await ensure_indexes()
+            # Rank snapshots are read through the leaderboard indexes
+            Leaderboard.get_instance().warm()
+
 
 bot = DaFarmz()
 app = FastAPI()
@@ -65,18 +88,76 @@ async def reload(ctx, extension):
     await ctx.send("Done")
 
 
+@bot.command(hidden=True)
+@commands.is_owner()
+async def renderstats(ctx):
+    await ctx.send(
+        f"Atlas: {SpriteAtlas.get_instance().stats()}\n"
+        f"Render cache: {RenderCache.get_instance().stats()}\n"
+        f"Render executor: {RenderExecutor.get_instance().stats()}"
+    )
+
+
+@bot.command(hidden=True)
+@commands.is_owner()
+async def cachestats(ctx):
+    await ctx.send(
+        f"User cache: {UserCache.get_instance().stats()}\n"
+        f"Stat aggregator: {StatAggregator.get_instance().stats()}\n"
+        f"Challenge progress: {ChallengeProgress.get_instance().stats()}"
+    )
+
+
+@bot.command(hidden=True)
+@commands.is_owner()
+async def indexreport(ctx):
+    lines = []
+    for row in await explain_query_shapes():
+        flag = "COLLSCAN" if row["collscan"] else "ok"
+        lines.append(
+            f"[{flag}] {row['collection']}: {row['name']} "
+            f"({' > '.join(row['stages'])}, {row['docs_examined']} docs examined)")
+
+    await ctx.send("\n".join(lines) or "No query shapes registered")
+
+
+@bot.command(hidden=True)
+@commands.is_owner()
+async def migratefarms(ctx):
+    if not ShopData.all():
+        return await ctx.send("Shop data isn't loaded yet")
+
+    migrated = await FarmModel.migrate_to_slim()
+    await ctx.send(f"Migrated {migrated} farms")
+
+
 for filename in os.listdir("./cogs"):
     if filename.endswith(".py"):
         bot.load_extension(f"cogs.{filename[:-3]}")
 
 bot.load_extension("jishaku")
 
+# Decode farm sprites once before any renders happen
+SpriteAtlas.get_instance().load()
+RenderExecutor.get_instance().start()
+
 
 async def run():
+    # Close the bot (flushing buffered stats) on Ctrl+C or a stop signal,
+    # KeyboardInterrupt would be raised outside of this coroutine
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, lambda: asyncio.ensure_future(bot.close()))
+        except NotImplementedError:
+            # Not supported on Windows
+            pass
+
     try:
         await bot.start(TOKEN)
-    except KeyboardInterrupt:
-        await bot.close()
+    finally:
+        if not bot.is_closed():
+            await bot.close()
 
 loop = asyncio.get_event_loop()
 loop.run_until_complete(run())
@@ -2,10 +2,21 @@ from datetime import datetime
 import random
 from typing import Any, Dict, List
 from pydantic import BaseModel, Field
+from pymongo import ASCENDING, IndexModel
+
 from db.database import Database
 
 COLLECTION_NAME = "challenges"
 
+INDEXES = [
+    IndexModel([("level", ASCENDING)]),
+]
+
+# Representative queries, checked by `db.indexes.explain_query_shapes`
+QUERY_SHAPES = [
+    {"name": "challenges up to level", "filter": {"level": {"$lte": 1}}},
+]
+
 
 class ChallengeOptionModel(BaseModel):
     """
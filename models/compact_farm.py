@@ -0,0 +1,197 @@
+from array import array
+from datetime import datetime, timedelta
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from db.shop_data import ShopData, shop_key
+from models.yieldmodel import YieldModel
+
+GRID_COLUMNS = "ABCDEF"
+GRID_ROWS = 6
+GRID_SIZE = len(GRID_COLUMNS) * GRID_ROWS
+
+EPOCH = datetime(1970, 1, 1)
+ONE_US = timedelta(microseconds=1)
+NOT_HARVESTED = -(1 << 63)
+
+
+def plot_index(plot_id: str) -> Optional[int]:
+    """
+    Convert a plot id (A1, B5, etc.) to its index in the grid, or None if the
+    plot is outside of the grid.
+    """
+    column = GRID_COLUMNS.find(plot_id[:1])
+    if column < 0 or not plot_id[1:].isdigit():
+        return None
+
+    row = int(plot_id[1:]) - 1
+    if not 0 <= row < GRID_ROWS:
+        return None
+
+    return row * len(GRID_COLUMNS) + column
+
+
+def plot_id_at(index: int) -> str:
+    row, column = divmod(index, len(GRID_COLUMNS))
+    return f"{GRID_COLUMNS[column]}{row + 1}"
+
+
+def _to_us(value: Optional[datetime]) -> int:
+    return NOT_HARVESTED if value is None else (value - EPOCH) // ONE_US
+
+
+def _from_us(value: int) -> Optional[datetime]:
+    return None if value == NOT_HARVESTED else EPOCH + value * ONE_US
+
+
+class CompactPlot:
+    """
+    What is planted in a plot. `yields` and `death_yields` are only set for
+    plots that still carry their own copy of the shop tables, and are shared
+    between every plot with the same tables.
+    """
+    __slots__ = ("key", "has_data", "yields", "death_yields", "inline_grow_time")
+
+    def __init__(
+        self,
+        key: str,
+        has_data: bool,
+        yields: Optional[Dict[str, YieldModel]] = None,
+        death_yields: Optional[Dict[str, YieldModel]] = None,
+        inline_grow_time: bool = False
+    ):
+        self.key = key
+        self.has_data = has_data
+        self.yields = yields
+        self.death_yields = death_yields
+        self.inline_grow_time = inline_grow_time
+
+    def get_yields(self) -> Dict[str, YieldModel]:
+        if self.yields is not None:
+            return self.yields
+        item = ShopData.get(shop_key(self.key))
+        return item.yields if item else {}
+
+    def get_death_yields(self) -> Dict[str, YieldModel]:
+        if self.death_yields is not None:
+            return self.death_yields
+        item = ShopData.get(shop_key(self.key))
+        return item.death_yields if item else {}
+
+
+class CompactFarm:
+    """
+    A memory efficient, read-mostly representation of a farm. Plots live in
+    a fixed grid indexed by `plot_index` and their timestamps, remaining
+    yields and grow times are kept in typed arrays. Documents are validated
+    once when converted, so no per-plot pydantic models are created. Grow
+    times not stored on the plot are filled in from the shop.
+
+    Plots outside of the grid are kept as raw documents in `extra_plots`.
+    """
+    __slots__ = (
+        "id", "discord_id", "cells", "planted_us", "last_harvested_us",
+        "yields_remaining", "grow_time_hr", "extra_plots"
+    )
+
+    def __init__(self, id: ObjectId, discord_id: str):
+        self.id = id
+        self.discord_id = discord_id
+        self.cells: List[Optional[CompactPlot]] = [None] * GRID_SIZE
+        self.planted_us = array("q", [NOT_HARVESTED]) * GRID_SIZE
+        self.last_harvested_us = array("q", [NOT_HARVESTED]) * GRID_SIZE
+        self.yields_remaining = array("q", [0]) * GRID_SIZE
+        self.grow_time_hr = array("d", [math.nan]) * GRID_SIZE
+        self.extra_plots: Dict[str, Any] = {}
+
+    @classmethod
+    def from_document(cls, doc):
+        """
+        Build a compact farm from a `farms` document.
+
+        :param doc: The raw document from the database.
+        :return: A new instance of `CompactFarm`.
+        """
+        farm = cls(doc["_id"], str(doc["discord_id"]))
+        tables: Dict[Tuple, Dict[str, YieldModel]] = {}
+
+        def shared_table(raw):
+            if raw is None:
+                return None
+            # Documents from the same shop item have identical tables
+            table_key = tuple(sorted(
+                (k, tuple(sorted(v.items()))) for k, v in raw.items()))
+            table = tables.get(table_key)
+            if table is None:
+                table = {k: YieldModel(**v) for k, v in raw.items()}
+                tables[table_key] = table
+            return table
+
+        for plot_id, plot in doc.get("plot", {}).items():
+            index = plot_index(plot_id)
+            if index is None:
+                farm.extra_plots[plot_id] = plot
+                continue
+
+            data = plot.get("data") or {}
+            grow_time_hr = data.get("grow_time_hr")
+            farm.cells[index] = CompactPlot(
+                str(plot["key"]),
+                bool(plot.get("data")),
+                shared_table(data.get("yields")),
+                shared_table(data.get("death_yields")),
+                grow_time_hr is not None
+            )
+
+            for field, column in (("planted_at", farm.planted_us), ("last_harvested_at", farm.last_harvested_us)):
+                value = data.get(field)
+                if value is not None and not isinstance(value, datetime):
+                    raise ValueError(f"Plot {plot_id} has an invalid {field}")
+                column[index] = _to_us(value)
+
+            farm.yields_remaining[index] = int(data.get("yields_remaining") or 0)
+            if grow_time_hr is None and data:
+                item = ShopData.get(shop_key(str(plot["key"])))
+                grow_time_hr = item.grow_time_hr if item else None
+            farm.grow_time_hr[index] = float(grow_time_hr) if grow_time_hr else math.nan
+
+        return farm
+
+    def to_document(self):
+        """
+        Convert back to the `farms` document shape.
+        """
+        plot = {}
+        for index, cell in enumerate(self.cells):
+            if cell is None:
+                continue
+
+            data = None
+            if cell.has_data:
+                data = {
+                    "yields_remaining": self.yields_remaining[index],
+                    "planted_at": _from_us(self.planted_us[index]),
+                    "last_harvested_at": _from_us(self.last_harvested_us[index]),
+                }
+                # Only write back what the plot stored itself
+                if cell.yields is not None:
+                    data["yields"] = {k: v.model_dump() for k, v in cell.yields.items()}
+                if cell.death_yields is not None:
+                    data["death_yields"] = {k: v.model_dump() for k, v in cell.death_yields.items()}
+                if cell.inline_grow_time:
+                    grow_time_hr = self.grow_time_hr[index]
+                    data["grow_time_hr"] = None if math.isnan(grow_time_hr) else grow_time_hr
+
+            plot[plot_id_at(index)] = {"key": cell.key, "data": data}
+
+        plot.update(self.extra_plots)
+        return {"_id": self.id, "discord_id": self.discord_id, "plot": plot}
+
+    def get(self, plot_id: str) -> Optional[CompactPlot]:
+        index = plot_index(plot_id)
+        return None if index is None else self.cells[index]
+
+    def planted(self) -> List[int]:
+        return [i for i, cell in enumerate(self.cells) if cell is not None]
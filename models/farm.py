@@ -1,29 +1,57 @@
-from datetime import datetime
-import pdb
-from typing import Any, Dict, Optional, Tuple
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
 
+import numpy as np
 from bson import ObjectId
-from pydantic import BaseModel, Field
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pydantic import BaseModel, Field, PrivateAttr
 
 from db.database import Database
+from db.shop_data import ShopData, shop_key
+from models.compact_farm import CompactFarm
 from models.pyobjectid import PyObjectId
 from models.shop import ShopModel
 from models.yieldmodel import YieldModel
-from utils.plant_state import can_harvest
-from utils.yields import get_yield_with_odds
+from utils.growth import compute_growth
+from utils.plant_state import get_stage_schedule
+from utils.yields import sample_yields
 
 COLLECTION_NAME = "farms"
 
+INDEXES = [
+    IndexModel([("discord_id", ASCENDING)], unique=True),
+]
+
+# Representative queries, checked by `db.indexes.explain_query_shapes`
+QUERY_SHAPES = [
+    {"name": "farm by discord_id", "filter": {"discord_id": "0"}},
+]
+
+
+def _stored_datetime(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    MongoDB stores datetimes with millisecond precision, truncate to match.
+    """
+    if value is None:
+        return None
+    return value.replace(microsecond=value.microsecond - value.microsecond % 1000)
+
 
 class BasePlotItemData(BaseModel):
     """
     Potential data for a plot item. This model is used to represent the
     data attached to each plot item in the user's farm.
+
+    Yield tables and grow times are looked up from the shop by the plot's key
+    (see `FarmPlotItem.shop_item`). `yields`, `death_yields` and
+    `grow_time_hr` are only set on plots planted before that, until
+    `FarmModel.migrate_to_slim` removes them.
     """
     yields_remaining: Optional[int] = None
+    planted_at: Optional[datetime] = None
     last_harvested_at: Optional[datetime] = None
-    yields: Dict[str, YieldModel] = {}
-    death_yields: Optional[Dict[str, YieldModel]] = {}
+    yields: Optional[Dict[str, YieldModel]] = None
+    death_yields: Optional[Dict[str, YieldModel]] = None
     grow_time_hr: Optional[float] = None
 
     class Config:
@@ -44,6 +72,30 @@ class FarmPlotItem(BaseModel):
     key: str
     data: Optional[BasePlotItemData] = None
 
+    def shop_item(self) -> Optional[ShopModel]:
+        """
+        Get the shop item this plot was planted from.
+        """
+        return ShopData.get(shop_key(self.key))
+
+    def get_yields(self) -> Dict[str, YieldModel]:
+        if self.data and self.data.yields is not None:
+            return self.data.yields
+        item = self.shop_item()
+        return item.yields if item else {}
+
+    def get_death_yields(self) -> Dict[str, YieldModel]:
+        if self.data and self.data.death_yields is not None:
+            return self.data.death_yields
+        item = self.shop_item()
+        return item.death_yields if item else {}
+
+    def get_grow_time_hr(self) -> Optional[float]:
+        if self.data and self.data.grow_time_hr is not None:
+            return self.data.grow_time_hr
+        item = self.shop_item()
+        return item.grow_time_hr if item else None
+
     class Config:
         arbitrary_types_allowed = True
         from_attributes = True
@@ -58,6 +110,16 @@ class FarmModel(BaseModel):
     discord_id: str
     plot: Dict[str, FarmPlotItem]
 
+    # The (key, last_harvested_at) of each plot as last read or written, used
+    # as the precondition when saving changed plots.
+    _stored_plots: Dict[str, Tuple[str, Optional[datetime]]] = PrivateAttr(
+        default_factory=dict)
+    # Plots added, changed or removed since the farm was loaded
+    _dirty_plots: Set[str] = PrivateAttr(default_factory=set)
+    _persisted: bool = PrivateAttr(default=False)
+    # The fields loaded by `find_partial`, None if the whole farm was loaded
+    _partial_fields: Optional[Set[str]] = PrivateAttr(default=None)
+
     @classmethod
     async def find_by_discord_id(cls, discord_id):
         collection = Database.get_instance().get_collection(COLLECTION_NAME)
@@ -65,67 +127,167 @@ class FarmModel(BaseModel):
             "discord_id": str(discord_id)
         })
 
-        return cls(**doc) if doc else None
+        return cls.from_document(doc) if doc else None
+
+    @classmethod
+    def from_document(cls, doc):
+        farm = cls(**doc)
+        farm._persisted = True
+        farm._stored_plots = {
+            plot_id: farm._plot_state(plot_id) for plot_id in farm.plot
+        }
+        return farm
+
+    @classmethod
+    async def find_partial(cls, discord_id, fields: List[str]):
+        """
+        Load only some fields of a farm (e.g. ["plot.A1"]) for read-only use.
+        A partial farm can't be saved.
 
-    def harvest(self) -> Tuple[Dict[str, YieldModel], int]:
+        :param discord_id: The discord ID of the farm owner.
+        :param fields: The fields to load, dotted paths are allowed.
+        :return: The farm if it was found, else None.
         """
-        Harvests the user's farm. This method will remove any dead plot items
-        and return the yields and xp earned from the harvest.
+        collection = Database.get_instance().get_collection(COLLECTION_NAME)
+        doc = await collection.find_one(
+            {"discord_id": str(discord_id)},
+            {"discord_id": 1, **{field: 1 for field in fields}}
+        )
+
+        if not doc:
+            return None
 
+        farm = cls.from_document({"plot": {}, **doc})
+        farm._partial_fields = set(fields)
+        return farm
+
+    @classmethod
+    async def find_compact_by_discord_id(cls, discord_id) -> Optional[CompactFarm]:
+        """
+        Load a farm as a `CompactFarm`, skipping per-plot model validation.
+        Use this for read-only work on many farms.
+        """
+        collection = Database.get_instance().get_collection(COLLECTION_NAME)
+        doc = await collection.find_one({
+            "discord_id": str(discord_id)
+        })
+
+        return CompactFarm.from_document(doc) if doc else None
+
+    @classmethod
+    def from_compact(cls, compact: CompactFarm):
+        return cls.from_document(compact.to_document())
+
+    def to_compact(self) -> CompactFarm:
+        return CompactFarm.from_document(self.model_dump(by_alias=True))
+
+    def _plot_state(self, plot_id: str) -> Tuple[str, Optional[datetime]]:
+        plot_item = self.plot[plot_id]
+        last_harvested_at = plot_item.data.last_harvested_at if plot_item.data else None
+        return (plot_item.key, _stored_datetime(last_harvested_at))
+
+    def harvest(self, seed: Optional[int] = None) -> Tuple[Dict[str, YieldModel], int]:
+        """
+        Harvests the user's farm. Plots are credited for every grow cycle
+        completed since they were last harvested. This method will remove any
+        dead plot items and return the yields and xp earned from the harvest.
+
+        :param seed: Seed for the yield draws, used to replay a harvest.
         :return: A tuple containing the yields and xp earned from the harvest.
         """
         harvest_yield: Dict[str, YieldModel] = {}
         dead_plot_items = []
         xp_earned = 0
+        growth = compute_growth(self.plot)
 
-        for plot_id, plot_item in self.plot.items():
+        # (item key, yield, cycles) for every draw this harvest needs
+        yield_specs = []
+        for plot_id, is_ready, cycles in zip(growth.plot_ids, growth.harvestable, growth.cycles.tolist()):
+            plot_item = self.plot[plot_id]
             if plot_item.data:
-                is_ready = can_harvest(
-                    plot_item.key,
-                    plot_item.data.last_harvested_at,
-                    plot_item.data.grow_time_hr
-                )
-
                 if is_ready:
-                    for yield_item in plot_item.data.yields.values():
-                        xp_earned += yield_item.xp
+                    # Credit every cycle completed since the last harvest,
+                    # but never more than the plant has left to give.
+                    cycles = min(cycles, max(1, plot_item.data.yields_remaining))
+
+                    yields = plot_item.get_yields()
+                    for yield_item in yields.values():
+                        xp_earned += yield_item.xp * cycles
 
-                    plot_item.data.yields_remaining -= 1
-                    plot_item.data.last_harvested_at = datetime.utcnow()
+                    plot_item.data.yields_remaining -= cycles
+                    self._dirty_plots.add(plot_id)
+                    # Keep partial progress towards the next cycle
+                    plot_item.data.last_harvested_at += timedelta(
+                        hours=plot_item.get_grow_time_hr() * cycles)
 
-                    yields: Dict[str, YieldModel] | Any = getattr(
-                        plot_item.data, "yields", {})
                     for k, v in yields.items():
-                        if k in harvest_yield:
-                            harvest_yield[k].amount += get_yield_with_odds(v)
-                        else:
-                            amount = get_yield_with_odds(v)
-                            if amount > 0:
-                                harvest_yield[k] = YieldModel(amount=amount)
+                        yield_specs.append((k, v, cycles))
 
                 # Mark plot item as dead if no yields remaining
                 if plot_item.data.yields_remaining <= 0:
                     dead_plot_items.append(plot_id)
+                    self._dirty_plots.add(plot_id)
+
+                    # Dead plot items give their death_yields once
+                    for k, v in plot_item.get_death_yields().items():
+                        yield_specs.append((k, v, 1))
+
+        amounts = sample_yields(
+            [(v, cycles) for _, v, cycles in yield_specs],
+            np.random.default_rng(seed)
+        )
+        for (k, _, _), amount in zip(yield_specs, amounts):
+            # Key has already been added, just increment the amount
+            if k in harvest_yield:
+                harvest_yield[k].amount += amount
+            elif amount > 0:
+                harvest_yield[k] = YieldModel(amount=amount)
 
         # Remove dead plot items (no yields remaining)
         for plot_item in dead_plot_items:
-            # Check for death_yields and add them to the harvest_yield
-            if self.plot[plot_item].data.death_yields:
-                for k, v in self.plot[plot_item].data.death_yields.items():
-                    # Key has already been added, just increment the amount
-                    if k in harvest_yield:
-                        harvest_yield[k].amount += get_yield_with_odds(v)
-                    else:
-                        amount = get_yield_with_odds(v)
-                        if amount > 0:
-                            harvest_yield[k] = YieldModel(amount=amount)
-
-            # Remove the plot item from the plot
             del self.plot[plot_item]
 
-        print(harvest_yield)
         return (harvest_yield, xp_earned)
 
+    def stage_schedules(self) -> Dict[str, List[datetime]]:
+        """
+        Get the start time of every growth stage for each growing plot. The
+        last time in each schedule is when that plot becomes harvestable.
+
+        :return: A dict of plot id to stage start times.
+        """
+        schedules = {}
+        for plot_id, plot_item in self.plot.items():
+            if plot_item.data:
+                schedule = get_stage_schedule(
+                    plot_item.key,
+                    plot_item.data.last_harvested_at,
+                    plot_item.get_grow_time_hr()
+                )
+                if schedule:
+                    schedules[plot_id] = schedule
+
+        return schedules
+
+    def next_stage_change(self, now: Optional[datetime] = None) -> Optional[datetime]:
+        """
+        Get the next time any plot changes stage or becomes harvestable.
+        Anything derived from the farm's stages (e.g. a rendered image) stays
+        valid until then.
+
+        :param now: The time to look ahead from, defaults to utcnow.
+        :return: The time of the next change, or None if nothing is growing.
+        """
+        now = now or datetime.utcnow()
+        upcoming = [
+            at
+            for schedule in self.stage_schedules().values()
+            for at in schedule
+            if at > now
+        ]
+
+        return min(upcoming, default=None)
+
     def plant(self, location: str, item: ShopModel):
         # Check if the plot location is already taken
         if self.plot.get(location):
@@ -135,32 +297,144 @@ class FarmModel(BaseModel):
         if not item.key.startswith("seed:"):
             return False
 
-        yields = item.yields
-        death_yields = item.death_yields
-        yields_remaining = item.total_yields
-        grow_time_hr = item.grow_time_hr
-
+        # Yields and grow time are looked up from the shop by key, so only
+        # the plant's progress is stored
+        planted_at = datetime.utcnow()
+        self._dirty_plots.add(location)
         self.plot[location] = FarmPlotItem(
             # Replace the seed type with 'plant:' after planting
             key=item.key.replace("seed:", "plant:"),
             data=BasePlotItemData(
-                yields_remaining=yields_remaining,
-                last_harvested_at=datetime.utcnow(),
-                yields=yields,
-                death_yields=death_yields,
-                grow_time_hr=grow_time_hr
+                yields_remaining=item.total_yields,
+                planted_at=planted_at,
+                last_harvested_at=planted_at
             )
         )
 
         return True
 
-    async def save_plot(self):
+    def pending_plot_write(self) -> Optional[Tuple[Dict, Dict, bool]]:
+        """
+        Build the write that saves the plots changed since the farm was
+        loaded. Each changed plot is only written if it still holds what was
+        loaded, so two views of the same farm can't overwrite each other's
+        changes. Call `mark_plot_saved` once the write succeeds.
+
+        :return: A tuple of the filter, update and upsert flag for
+        `update_one`, or None if nothing changed.
+        """
+        if self._partial_fields is not None:
+            raise ValueError(
+                f"Can't save farm {self.discord_id}, only {sorted(self._partial_fields)} were loaded")
+
+        if not self._persisted:
+            return (
+                {"_id": self.id},
+                {
+                    "$set": {"plot": {k: v.model_dump(exclude_none=True) for k, v in self.plot.items()}},
+                    "$setOnInsert": {"discord_id": self.discord_id},
+                },
+                True
+            )
+
+        if not self._dirty_plots:
+            return None
+
+        query = {"_id": self.id}
+        set_plots = {}
+        unset_plots = {}
+        for plot_id in self._dirty_plots:
+            stored = self._stored_plots.get(plot_id)
+            if stored:
+                key, last_harvested_at = stored
+                query[f"plot.{plot_id}.key"] = key
+                if last_harvested_at:
+                    query[f"plot.{plot_id}.data.last_harvested_at"] = last_harvested_at
+            else:
+                query[f"plot.{plot_id}"] = {"$exists": False}
+
+            if plot_id in self.plot:
+                set_plots[f"plot.{plot_id}"] = self.plot[plot_id].model_dump(
+                    exclude_none=True)
+            else:
+                unset_plots[f"plot.{plot_id}"] = ""
+
+        update = {}
+        if set_plots:
+            update["$set"] = set_plots
+        if unset_plots:
+            update["$unset"] = unset_plots
+
+        return (query, update, False)
+
+    def mark_plot_saved(self):
+        self._persisted = True
+        self._stored_plots = {
+            plot_id: self._plot_state(plot_id) for plot_id in self.plot
+        }
+        self._dirty_plots.clear()
+
+    async def save_plot(self, session=None) -> bool:
+        """
+        Save the plots that changed since the farm was loaded. See
+        `pending_plot_write`.
+
+        :param session: An optional session to write in (e.g. a transaction).
+        The farm is marked as saved straight away, so when writing in a
+        transaction use `pending_plot_write` and `mark_plot_saved` instead.
+        :return: True if the changes were saved, False if the farm was
+        changed elsewhere in the meantime.
+        """
+        write = self.pending_plot_write()
+        if write:
+            collection = Database.get_instance().get_collection(COLLECTION_NAME)
+            query, update, upsert = write
+            result = await collection.update_one(
+                query, update, upsert=upsert, session=session)
+            if result.matched_count == 0 and not upsert:
+                return False
+
+        self.mark_plot_saved()
+        return True
+
+    @classmethod
+    async def migrate_to_slim(cls, batch_size: int = 500) -> int:
+        """
+        Remove the yield tables and grow times copied into plots planted
+        before they were looked up from the shop. Plots whose item is no
+        longer in the shop keep their copies. The shop data must be loaded.
+
+        :param batch_size: The number of farm updates to send per bulk write.
+        :return: The number of farms rewritten.
+        """
         collection = Database.get_instance().get_collection(COLLECTION_NAME)
-        await collection.update_one(
-            {"_id": self.id},
-            {"$set": {"plot": {k: v.model_dump() for k, v in self.plot.items()}}},
-            upsert=True
-        )
+        cursor = collection.find({}, {"plot": 1}, batch_size=batch_size)
+
+        migrated = 0
+        updates = []
+        async for doc in cursor:
+            unset = {}
+            for plot_id, plot in (doc.get("plot") or {}).items():
+                data = plot.get("data") or {}
+                if not ShopData.get(shop_key(str(plot.get("key", "")))):
+                    continue
+                for field in ("yields", "death_yields", "grow_time_hr"):
+                    if field in data:
+                        unset[f"plot.{plot_id}.data.{field}"] = ""
+
+            if unset:
+                updates.append(UpdateOne({"_id": doc["_id"]}, {"$unset": unset}))
+
+            if len(updates) >= batch_size:
+                result = await collection.bulk_write(updates, ordered=False)
+                migrated += result.modified_count
+                updates = []
+
+        if updates:
+            result = await collection.bulk_write(updates, ordered=False)
+            migrated += result.modified_count
+
+        return migrated
 
     class Config:
         arbitrary_types_allowed = True
@@ -2,6 +2,7 @@ from typing import Dict
 
 from bson import ObjectId
 from pydantic import BaseModel, Field
+from pymongo import ASCENDING, IndexModel
 
 from db.database import Database
 from models.pyobjectid import PyObjectId
@@ -9,6 +10,15 @@ from models.yieldmodel import YieldModel
 
 COLLECTION_NAME = "shop"
 
+INDEXES = [
+    IndexModel([("cost", ASCENDING)]),
+]
+
+# Representative queries, checked by `db.indexes.explain_query_shapes`
+QUERY_SHAPES = [
+    {"name": "buyable items", "filter": {"cost": {"$gt": 0}}},
+]
+
 
 class ShopModel(BaseModel):
     """
@@ -1,13 +1,23 @@
+import asyncio
+import copy
 import logging
 from datetime import datetime
-from typing import Any, Dict, Optional, Tuple
+from enum import Enum
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from bson import ObjectId
-from pydantic import BaseModel, Field
-from pymongo import ReturnDocument
+from pydantic import BaseModel, Field, PrivateAttr
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from pymongo.errors import OperationFailure
 
+from db.challenge_data import ChallengeData
+from db.challenge_progress import ChallengeProgress
 from db.database import Database
+from db.stat_aggregator import StatAggregator
+from db.user_cache import UserCache
 from models.challenges import ChallengesModel
+from models.farm import COLLECTION_NAME as FARMS_COLLECTION_NAME
+from models.farm import FarmModel
 from models.pyobjectid import PyObjectId
 from models.yieldmodel import YieldModel
 from utils.level_calculator import level_based_on_xp
@@ -16,6 +26,111 @@ logger = logging.getLogger(__name__)
 
 COLLECTION_NAME = "users"
 
+INDEXES = [
+    IndexModel([("discord_id", ASCENDING)], unique=True),
+]
+
+# Representative queries, checked by `db.indexes.explain_query_shapes`
+QUERY_SHAPES = [
+    {"name": "user by discord_id", "filter": {"discord_id": "0"}},
+    {"name": "transfer users", "filter": {"discord_id": {"$in": ["0", "1"]}}},
+]
+
+
+# Fields that identify a list element, e.g. a challenge option
+_ELEMENT_IDENTITY_KEYS = ("description",)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _same_element(old, new) -> bool:
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return True
+    return all(old.get(key) == new.get(key) for key in _ELEMENT_IDENTITY_KEYS)
+
+
+def _diff_update(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Build the smallest update that turns the stored document `old` into
+    `new`. Changed numbers become `$inc`s, other changes `$set`s and removed
+    keys `$unset`s. Lists of the same length are diffed element by element
+    (e.g. `challenges.options.0.progress.harvest.count` as an `$inc`), but an
+    element replaced by a different one (see `_ELEMENT_IDENTITY_KEYS`) is
+    `$set` whole so none of the old element's counts carry over. Lists that
+    grew or shrank are replaced whole.
+    """
+    update = {"$set": {}, "$unset": {}, "$inc": {}}
+
+    def diff(old, value, path):
+        if isinstance(old, dict) and isinstance(value, dict):
+            walk(old, value, f"{path}.")
+        elif isinstance(old, list) and isinstance(value, list) and len(old) == len(value):
+            for index, (old_item, item) in enumerate(zip(old, value)):
+                if _same_element(old_item, item):
+                    diff(old_item, item, f"{path}.{index}")
+                else:
+                    update["$set"][f"{path}.{index}"] = item
+        elif _is_number(old) and _is_number(value):
+            if value != old:
+                update["$inc"][path] = value - old
+        elif value != old:
+            update["$set"][path] = value
+
+    def walk(old, new, prefix):
+        for key, value in new.items():
+            path = f"{prefix}{key}"
+            if key not in old:
+                update["$set"][path] = value
+            else:
+                diff(old[key], value, path)
+
+        for key in old.keys() - new.keys():
+            update["$unset"][f"{prefix}{key}"] = ""
+
+    walk(old, new, "")
+    return {op: fields for op, fields in update.items() if fields}
+
+
+def _item_increments(
+    items: Dict[str, YieldModel],
+    stats: Dict[str, int | float | Any]
+) -> Dict[str, Any]:
+    """
+    Build the `$inc` fields that add items to a user's inventory and stats.
+    """
+    inc_inventory = {}
+    for item, yields in items.items():
+        inc_inventory[f"inventory.{item}.amount"] = yields.amount
+
+    inc_stats = {}
+    for stat, yield_ in stats.items():
+        if isinstance(yield_, YieldModel):
+            # inc_stats = {f"stats.{stat}.{key}": value for key,
+            #              value in amount.model_dump().items()}
+            inc_stats = {}
+            for key, value in yield_.model_dump().items():
+                if key == "amount":
+                    inc_stats[f"stats.{stat}.{key}"] = value
+        else:
+            inc_stats[f"stats.{stat}"] = yield_
+
+    return {**inc_inventory, **inc_stats}
+
+
+class TransferResult(Enum):
+    OK = "ok"
+    SENDER_NOT_FOUND = "sender_not_found"
+    RECIPIENT_NOT_FOUND = "recipient_not_found"
+    INSUFFICIENT_FUNDS = "insufficient_funds"
+
+
+class _TransferAborted(Exception):
+    def __init__(self, result: TransferResult):
+        super().__init__(result.value)
+        self.result = result
+
 
 class UserInventoryItem(BaseModel):
     """
@@ -40,15 +155,161 @@ class UserModel(BaseModel):
     inventory: Dict[str, UserInventoryItem] = {}
     stats: Dict[str, int | float | Any] = {}
     challenges: Optional[ChallengesModel] = None
+    # Guilds the user has played in, for per-guild leaderboards
+    guild_ids: List[str] = []
+    # The last `StatAggregator` flush written to this user
+    stats_flush: Optional[PyObjectId] = None
+
+    # The fields loaded by `find_partial`, None if the whole user was loaded
+    _partial_fields: Optional[Set[str]] = PrivateAttr(default=None)
+    # The state as loaded, None for users that aren't in the database yet
+    _loaded_state: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+
+    @classmethod
+    def _from_document(cls, doc) -> "UserModel":
+        return cls(**doc)
+
+    @classmethod
+    def _from_write(cls, discord_id, doc, generation: int, session=None, track=True) -> Optional["UserModel"]:
+        """
+        Build a user from the document returned by a write and keep the
+        cache up to date. Writes in a session may still be rolled back, so
+        they only invalidate.
+
+        :param generation: `UserCache.generation` from before the write.
+        :param track: Whether to track the user's challenges from the
+        document, see `_loaded`.
+        """
+        cache = UserCache.get_instance()
+        if not doc or session is not None:
+            cache.invalidate(discord_id)
+            ChallengeProgress.get_instance().forget(discord_id)
+            return cls._loaded(cls._from_document(doc), track=False) if doc else None
+
+        user = cls._from_document(doc)
+        cache.put(discord_id, user, generation)
+        return cls._loaded(user, track=track)
+
+    @classmethod
+    def _loaded(cls, user: "UserModel", fields: Optional[List[str]] = None, track=True) -> "UserModel":
+        """
+        Prepare a user read from the database or cache. Stat increments that
+        haven't been written yet are added (see `StatAggregator`, cached
+        users never include them) and the result is remembered as the state
+        `save` diffs against. Their challenges are tracked by
+        `ChallengeProgress` unless `track` is False.
+        """
+        StatAggregator.get_instance().overlay(user, fields)
+        user._loaded_state = user._state()
+        if track and (fields is None or "challenges" in fields):
+            ChallengeProgress.get_instance().track(user.discord_id, user.challenges)
+        return user
+
+    def _state(self) -> Dict[str, Any]:
+        return copy.deepcopy(self.model_dump(exclude={"id"}))
 
     @classmethod
     async def find_by_discord_id(cls, discord_id):
+        cache = UserCache.get_instance()
+        user = cache.get(discord_id)
+        if user:
+            return cls._loaded(user)
+
+        generation = cache.generation(discord_id)
         collection = Database.get_instance().get_collection(COLLECTION_NAME)
         doc = await collection.find_one({
             "discord_id": str(discord_id)
         })
 
-        return cls(**doc) if doc else None
+        if not doc:
+            return None
+
+        user = cls._from_document(doc)
+        cache.put(discord_id, user, generation)
+        return cls._loaded(user)
+
+    @classmethod
+    async def find_partial(cls, discord_id, fields: List[str]) -> Optional["UserModel"]:
+        """
+        Load only some fields of a user (e.g. ["balance", "stats.xp"]) for
+        read-only use. Fields that aren't loaded keep their defaults and a
+        partial user can't be saved. If the whole user is cached, that is
+        returned instead.
+
+        :param discord_id: The discord ID of the user.
+        :param fields: The fields to load, dotted paths are allowed.
+        :return: The user if they were found, else None.
+        """
+        user = UserCache.get_instance().get(discord_id)
+        if user:
+            return cls._loaded(user)
+
+        collection = Database.get_instance().get_collection(COLLECTION_NAME)
+        doc = await collection.find_one(
+            {"discord_id": str(discord_id)},
+            {"discord_id": 1, "stats_flush": 1, **{field: 1 for field in fields}}
+        )
+
+        if not doc:
+            return None
+
+        user = cls._from_document(doc)
+        user._partial_fields = set(fields)
+        return cls._loaded(user, fields)
+
+    @classmethod
+    async def exists(cls, discord_id) -> bool:
+        if UserCache.get_instance().get(discord_id):
+            return True
+
+        collection = Database.get_instance().get_collection(COLLECTION_NAME)
+        doc = await collection.find_one({"discord_id": str(discord_id)}, {"_id": 1})
+        return doc is not None
+
+    @property
+    def is_partial(self) -> bool:
+        return self._partial_fields is not None
+
+    @classmethod
+    async def find_with_farm(cls, discord_id) -> Tuple[Optional["UserModel"], Optional[FarmModel]]:
+        """
+        Fetch a user and their farm in one round trip by joining the farm
+        onto the user with `$lookup`. If the aggregation isn't supported, both
+        documents are fetched concurrently instead.
+
+        :param discord_id: The discord ID of the user.
+        :return: A tuple of the user and their farm. The farm is only looked
+        up through the user, so it is None when the user doesn't exist.
+        """
+        generation = UserCache.get_instance().generation(discord_id)
+        collection = Database.get_instance().get_collection(COLLECTION_NAME)
+        try:
+            docs = await collection.aggregate([
+                {"$match": {"discord_id": str(discord_id)}},
+                {"$limit": 1},
+                {"$lookup": {
+                    "from": FARMS_COLLECTION_NAME,
+                    "localField": "discord_id",
+                    "foreignField": "discord_id",
+                    "as": "farm",
+                }},
+            ]).to_list(length=1)
+        except OperationFailure as e:
+            logger.warning(f"Falling back to separate user and farm queries: {e}")
+            user, farm = await asyncio.gather(
+                cls.find_by_discord_id(discord_id),
+                FarmModel.find_by_discord_id(discord_id)
+            )
+            return (user, farm if user else None)
+
+        if not docs:
+            return (None, None)
+
+        doc = docs[0]
+        farms = doc.pop("farm")
+        user = cls._from_document(doc)
+        UserCache.get_instance().put(discord_id, user, generation)
+        return (cls._loaded(user), FarmModel.from_document(farms[0]) if farms else None)
 
     @classmethod
     async def give_items(
@@ -56,25 +317,11 @@ class UserModel(BaseModel):
         discord_id,
         items: Dict[str, YieldModel],
         cost=0,
-        stats: Dict[str, int | float | Any] = {}
+        stats: Dict[str, int | float | Any] = {},
+        session=None
     ):
+        generation = UserCache.get_instance().generation(discord_id)
         collection = Database.get_instance().get_collection(COLLECTION_NAME)
-        inc_inventory = {}
-        for item, yields in items.items():
-            inc_inventory[f"inventory.{item}.amount"] = yields.amount
-
-        inc_stats = {}
-        for stat, yield_ in stats.items():
-            if isinstance(yield_, YieldModel):
-                # inc_stats = {f"stats.{stat}.{key}": value for key,
-                #              value in amount.model_dump().items()}
-                inc_stats = {}
-                for key, value in yield_.model_dump().items():
-                    if key == "amount":
-                        inc_stats[f"stats.{stat}.{key}"] = value
-            else:
-                inc_stats[f"stats.{stat}"] = yield_
-
         result = await collection.find_one_and_update(
             {
                 "discord_id": str(discord_id),
@@ -83,14 +330,14 @@ class UserModel(BaseModel):
             {
                 "$inc": {
                     "balance": -cost,
-                    **inc_inventory,
-                    **inc_stats
+                    **_item_increments(items, stats)
                 },
             },
-            return_document=ReturnDocument.AFTER
+            return_document=ReturnDocument.AFTER,
+            session=session
         )
 
-        return cls(**result) if result else None
+        return cls._from_write(discord_id, result, generation, session)
 
     @classmethod
     async def give_item(cls, discord_id, item, amount, cost=0):
@@ -108,6 +355,7 @@ class UserModel(BaseModel):
             },
         )
 
+        UserCache.get_instance().invalidate(discord_id)
         return result.modified_count > 0
 
     @classmethod
@@ -126,43 +374,36 @@ class UserModel(BaseModel):
             },
         )
 
+        UserCache.get_instance().invalidate(discord_id)
         return result.modified_count > 0
 
     @classmethod
     async def inc_stat(cls, discord_id, stat, amount=1):
-        collection = Database.get_instance().get_collection(COLLECTION_NAME)
-        result = await collection.update_one(
-            {
-                "discord_id": str(discord_id),
-            },
-            {
-                "$inc": {
-                    f"stats.{stat}": amount
-                },
-            },
-        )
-
-        return result.modified_count > 0
+        await cls.inc_stats(discord_id, {stat: amount})
 
     @classmethod
     async def inc_stats(cls, discord_id, stats: Dict[str, int | float | Any]):
+        """
+        Increment stats for a user. The increments are written behind by
+        `StatAggregator` together with other pending stats.
+        """
+        await StatAggregator.get_instance().add(discord_id, stats)
+
+    @classmethod
+    async def add_guild(cls, discord_id, guild_id):
         collection = Database.get_instance().get_collection(COLLECTION_NAME)
         result = await collection.update_one(
-            {
-                "discord_id": str(discord_id),
-            },
-            {
-                "$inc": {
-                    f"stats.{stat}": amount
-                    for stat, amount in stats.items()
-                },
-            },
+            {"discord_id": str(discord_id)},
+            {"$addToSet": {"guild_ids": str(guild_id)}},
         )
 
+        if result.modified_count:
+            UserCache.get_instance().invalidate(discord_id)
         return result.modified_count > 0
 
     @classmethod
     async def accept_challenge(cls, discord_id, challenge_index):
+        generation = UserCache.get_instance().generation(discord_id)
         collection = Database.get_instance().get_collection(COLLECTION_NAME)
         result = await collection.find_one_and_update(
             {
@@ -177,7 +418,7 @@ class UserModel(BaseModel):
             return_document=ReturnDocument.AFTER
         )
 
-        return cls(**result) if result else None
+        return cls._from_write(discord_id, result, generation)
 
     @classmethod
     async def refresh_challenges(
@@ -193,9 +434,10 @@ class UserModel(BaseModel):
             raise ValueError("You can only refresh challenges once per day.")
 
         collection = Database.get_instance().get_collection(COLLECTION_NAME)
-        challenges = await ChallengesModel.generate(level_based_on_xp(current_xp) + 1)
+        challenges = await ChallengeData.generate(level_based_on_xp(current_xp) + 1)
         challenges.max_active = max_active
 
+        generation = UserCache.get_instance().generation(discord_id)
         result = await collection.find_one_and_update(
             {
                 "discord_id": str(discord_id),
@@ -208,10 +450,10 @@ class UserModel(BaseModel):
             return_document=ReturnDocument.AFTER
         )
 
-        return cls(**result) if result else None
+        return cls._from_write(discord_id, result, generation)
 
     @classmethod
-    async def increment_challenge_progress(cls, discord_id, action, item, increment=1):
+    async def increment_challenge_progress(cls, discord_id, action, item, increment=1, session=None):
         """
         Increment the progress of a challenge for a user.
 
@@ -219,33 +461,177 @@ class UserModel(BaseModel):
         :param action: The action to increment as str. (e.g. "harvest", "plant", "buy")
         :param item: The item key to increment as str.
         :param increment: The amount to increment as int.
-        :return: A new instance of `UserModel` if the user was found, else None.
+        :param session: An optional session to run in (e.g. a transaction).
+        :return: The updated user, or None if no challenge progressed.
         """
+        return await cls.increment_challenges_progress(
+            discord_id, [(action, item, increment)], session=session)
+
+    @classmethod
+    async def increment_challenges_progress(
+        cls,
+        discord_id,
+        events: List[Tuple[str, str, int]],
+        session=None
+    ) -> Optional["UserModel"]:
+        """
+        Increment the progress of every accepted challenge that tracks any of
+        `events` in a single write. For users tracked by `ChallengeProgress`
+        the exact progress paths are known, so events no challenge counts
+        don't write at all.
+
+        :param discord_id: The discord ID of the user as int.
+        :param events: (action, item, increment) tuples, e.g.
+        ("harvest", "count", 1). Repeated (action, item) pairs are summed.
+        :param session: An optional session to run in (e.g. a transaction).
+        :return: The updated user, or None if no challenge progressed.
+        """
+        increments: Dict[Tuple[str, str], int] = {}
+        for action, item, increment in events:
+            increments[(action, item)] = increments.get((action, item), 0) + increment
+
+        if not increments:
+            return None
+
         collection = Database.get_instance().get_collection(COLLECTION_NAME)
-        user = await collection.find_one({"discord_id": str(discord_id)})
-
-        if not user:
-            return None  # User not found
-
-        for index, challenge in enumerate(user["challenges"]["options"]):
-            if challenge.get("accepted", False) and action in challenge["goal_stats"]:
-                # Check if the item matches what's required in the goal_stats
-                if item in challenge["goal_stats"][action]:
-                    # Increment progress
-                    progress_path = f"challenges.options.{index}.progress.{action}.{item}"
-                    await collection.update_one(
-                        {"discord_id": str(discord_id)},
-                        {"$inc": {progress_path: increment}}
-                    )
-
-        # Return the updated user document
-        updated_user = await collection.find_one({"discord_id": str(discord_id)})
-        return cls(**updated_user) if updated_user else None
+        engine = ChallengeProgress.get_instance()
+        plan = engine.plan(discord_id, increments)
+        if plan is not None:
+            inc, conditions = plan
+            if not inc:
+                return None
+
+            generation = UserCache.get_instance().generation(discord_id)
+            result = await collection.find_one_and_update(
+                {"discord_id": str(discord_id), **conditions},
+                {"$inc": inc},
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            if result:
+                # Writes in a session forget the user, see `_from_write`
+                user = cls._from_write(discord_id, result, generation, session, track=False)
+                if session is None:
+                    engine.apply(discord_id, increments)
+                return user
+
+            # The options moved since they were tracked
+            engine.forget(discord_id)
+
+        inc = {}
+        array_filters = []
+        option_matches = []
+        for index, ((action, item), increment) in enumerate(increments.items()):
+            # An accepted option whose goal_stats has this action and item
+            goal = {"accepted": True, f"goal_stats.{action}.{item}": {"$exists": True}}
+            option_matches.append(goal)
+            array_filters.append({f"e{index}.{k}": v for k, v in goal.items()})
+            inc[f"challenges.options.$[e{index}].progress.{action}.{item}"] = increment
+
+        generation = UserCache.get_instance().generation(discord_id)
+        result = await collection.find_one_and_update(
+            {
+                "discord_id": str(discord_id),
+                # Skip the write when no challenge tracks these events
+                "challenges.options": {"$elemMatch": {"$or": option_matches}},
+            },
+            {"$inc": inc},
+            array_filters=array_filters,
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+
+        if not result:
+            return None
+        return cls._from_write(discord_id, result, generation, session)
+
+    @classmethod
+    async def transfer(
+        cls,
+        sender_id,
+        recipient_id,
+        amount: int = 0,
+        items: Optional[Dict[str, int]] = None
+    ) -> TransferResult:
+        """
+        Move coins and/or items from one user to another. The sender is only
+        debited if they have enough of everything, and on a replica set the
+        debit and credit commit together in one transaction. A standalone
+        server doesn't support transactions, so there the sender is refunded
+        if the credit fails.
+
+        :param sender_id: The discord ID of the user paying.
+        :param recipient_id: The discord ID of the user being paid.
+        :param amount: The balance to move (in cents).
+        :param items: Item keys and amounts to move.
+        :return: The outcome of the transfer, nothing is moved unless it is
+        `TransferResult.OK`.
+        """
+        items = items or {}
+        if amount < 0 or any(n <= 0 for n in items.values()):
+            raise ValueError("Transfer amounts must be positive.")
+
+        sender_id, recipient_id = str(sender_id), str(recipient_id)
+        database = Database.get_instance()
+        collection = database.get_collection(COLLECTION_NAME)
+
+        found = {
+            doc["discord_id"]
+            async for doc in collection.find(
+                {"discord_id": {"$in": [sender_id, recipient_id]}},
+                {"discord_id": 1}
+            )
+        }
+        if sender_id not in found:
+            return TransferResult.SENDER_NOT_FOUND
+        if recipient_id not in found:
+            return TransferResult.RECIPIENT_NOT_FOUND
+
+        debit = {"balance": -amount, **{f"inventory.{k}.amount": -n for k, n in items.items()}}
+        credit = {"balance": amount, **{f"inventory.{k}.amount": n for k, n in items.items()}}
+
+        async def _transfer(session=None):
+            result = await collection.update_one(
+                {
+                    "discord_id": sender_id,
+                    "balance": {"$gte": amount},
+                    **{f"inventory.{k}.amount": {"$gte": n} for k, n in items.items()},
+                },
+                {"$inc": debit},
+                session=session
+            )
+            if result.matched_count == 0:
+                raise _TransferAborted(TransferResult.INSUFFICIENT_FUNDS)
+
+            result = await collection.update_one(
+                {"discord_id": recipient_id}, {"$inc": credit}, session=session)
+            if result.matched_count == 0:
+                raise _TransferAborted(TransferResult.RECIPIENT_NOT_FOUND)
+
+        try:
+            if await database.supports_transactions():
+                async with await database.client.start_session() as session:
+                    await session.with_transaction(_transfer)
+            else:
+                try:
+                    await _transfer()
+                except _TransferAborted as e:
+                    if e.result == TransferResult.RECIPIENT_NOT_FOUND:
+                        await collection.update_one(
+                            {"discord_id": sender_id}, {"$inc": credit})
+                    raise
+        except _TransferAborted as e:
+            return e.result
+        finally:
+            UserCache.get_instance().invalidate(sender_id)
+            UserCache.get_instance().invalidate(recipient_id)
+
+        return TransferResult.OK
 
     async def claim_challenge_rewards(self, challenge_index: int) -> Tuple["UserModel", Dict[str, YieldModel]]:
         """
-        Use .give_items() to claim the rewards for a challenge.
-        Remove the challenge from the user's challenges.
+        Claim the rewards for a challenge and replace it with a new one.
+        Nothing is given if the challenge was already claimed.
 
         :param challenge_index: The index of the challenge to claim as int.
         :return: A new instance of `UserModel` if the user was found, else None.
@@ -282,38 +668,46 @@ class UserModel(BaseModel):
             if key not in ["item:xp", "item:coin"]
         }
 
-        new_user = await UserModel.give_items(
-            self.discord_id,
-            filtered_rewards,
-            coins_earned,
-            stats={
-                # Increment the user's XP
-                "xp": xp_earned,
-                "challenge.xp": xp_earned,
-                "challenge.count": 1,
-                **{
-                    f"challenge.{item_key}": amount
-                    for item_key, amount in rewards.items()
-                }
-            }
+        claimed = self.challenges.options[challenge_index].description
+        new_challenge = await ChallengeData.generate(
+            level_based_on_xp(self.stats.get("xp", 0) + xp_earned) + 1, amount=1
         )
 
-        if new_user:
-            new_user.challenges = self.challenges
-            new_user.challenges.options.pop(challenge_index)
-            new_challenge = await ChallengesModel.generate(
-                level_based_on_xp(new_user.stats.get("xp", 0)) + 1, amount=1
-            )
-            new_user.challenges.options.append(new_challenge.options[0])
-            new_challenge.max_active = self.challenges.max_active
+        # Replace the claimed option and give its rewards in one update that
+        # only matches while the option is still there, so a challenge can't
+        # be claimed twice
+        generation = UserCache.get_instance().generation(self.discord_id)
+        collection = Database.get_instance().get_collection(COLLECTION_NAME)
+        result = await collection.find_one_and_update(
+            {
+                "discord_id": str(self.discord_id),
+                "challenges.options.description": claimed
+            },
+            {
+                "$set": {"challenges.options.$": new_challenge.options[0].model_dump()},
+                "$inc": {
+                    "balance": coins_earned,
+                    **_item_increments(filtered_rewards, {
+                        # Increment the user's XP
+                        "xp": xp_earned,
+                        "challenge.xp": xp_earned,
+                        "challenge.count": 1,
+                        **{
+                            f"challenge.{item_key}": amount
+                            for item_key, amount in rewards.items()
+                        }
+                    })
+                },
+            },
+            return_document=ReturnDocument.AFTER
+        )
 
-            await new_user.save()
-        else:
+        new_user = UserModel._from_write(self.discord_id, result, generation)
+        if not new_user:
             logger.warning(
-                f"User {self.discord_id} tried to claim challenge rewards but the user wasn't returned."
+                f"User {self.discord_id} tried to claim a challenge that was already claimed: {claimed}"
             )
-            raise ValueError(
-                "There was an issue claiming the challenge rewards.")
+            raise ValueError("This challenge was already claimed.")
 
         logger.debug(
             f"User {self.discord_id} claimed challenge rewards: {rewards}")
@@ -321,8 +715,25 @@ class UserModel(BaseModel):
         return (new_user, rewards_to_give)
 
     async def save(self):
+        if self.is_partial:
+            raise ValueError(
+                f"Can't save user {self.discord_id}, only {sorted(self._partial_fields)} were loaded")
+
         collection = Database.get_instance().get_collection(COLLECTION_NAME)
-        await collection.replace_one({"_id": self.id}, self.model_dump(), upsert=True)
+        state = self._state()
+        if self._loaded_state is None:
+            await collection.replace_one({"_id": self.id}, self.model_dump(), upsert=True)
+        else:
+            # Only write what changed, numbers as increments so concurrent
+            # $inc updates (e.g. give_items) aren't overwritten
+            update = _diff_update(self._loaded_state, state)
+            if update:
+                await collection.update_one({"_id": self.id}, update)
+
+        self._loaded_state = state
+        UserCache.get_instance().invalidate(self.discord_id)
+        # Challenge progress may have moved on since this user was loaded
+        ChallengeProgress.get_instance().forget(self.discord_id)
 
     @property
     def current_level(self):
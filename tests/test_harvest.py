@@ -0,0 +1,55 @@
+from db.shop_data import ShopData
+from models.farm import FarmModel
+from models.shop import ShopModel
+from models.yieldmodel import YieldModel
+from utils.plant_state import IMAGE_YIELD_MAP
+
+
+def make_seed():
+    key = sorted(IMAGE_YIELD_MAP)[0].replace("plant:", "seed:")
+    return ShopModel(
+        key=key,
+        grow_time_hr=1,
+        total_yields=1,
+        yields={"item:test": YieldModel(amount=1, xp=1)},
+        death_yields={"item:test-death": YieldModel(amount=1)},
+    )
+
+
+def make_dead_unready_farm(seed):
+    farm = FarmModel(discord_id="test-dead-plot", plot={})
+    assert farm.plant("A1", seed)
+    # Out of yields, but just planted so not ready
+    farm.plot["A1"].data.yields_remaining = 0
+    return FarmModel.from_document(farm.model_dump(by_alias=True))
+
+
+def test_dead_plot_that_isnt_ready_is_removed_by_the_harvest_write():
+    seed = make_seed()
+    ShopData.set_data([seed], [seed])
+    farm = make_dead_unready_farm(seed)
+
+    (harvest_yield, _) = farm.harvest(seed=0)
+    assert "item:test-death" in harvest_yield
+    assert "A1" not in farm.plot
+
+    write = farm.pending_plot_write()
+    assert write is not None
+    (query, update, upsert) = write
+    assert update.get("$unset") == {"plot.A1": ""}
+    assert query["plot.A1.key"] == "plant:" + seed.key[len("seed:"):]
+    assert not upsert
+
+
+def test_dead_plot_death_yields_are_paid_once():
+    seed = make_seed()
+    ShopData.set_data([seed], [seed])
+    farm = make_dead_unready_farm(seed)
+
+    farm.harvest(seed=0)
+    farm.mark_plot_saved()
+
+    (harvest_yield, xp_earned) = farm.harvest(seed=0)
+    assert harvest_yield == {}
+    assert xp_earned == 0
+    assert farm.pending_plot_write() is None
@@ -0,0 +1,211 @@
+"""
+# Vectorized growth stage math.
+# ---
+# Computes the same stages as `utils.plant_state.get_stage` for every plot of
+# one or more farms in a single NumPy pass, so a request only has to work out
+# each plot's stage once.
+"""
+from datetime import datetime
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models.compact_farm import plot_id_at
+from utils.plant_state import IMAGE_YIELD_MAP
+
+logger = logging.getLogger(__name__)
+
+NOT_HARVESTED = np.datetime64("NaT", "us")
+
+
+class FarmGrowth:
+    """
+    The growth state of every plot in a farm. Arrays are indexed in the same
+    order as `plot_ids`.
+    """
+    __slots__ = ("plot_ids", "keys", "stages", "sprites", "harvestable", "cycles")
+
+    def __init__(
+        self,
+        plot_ids: List[str],
+        keys: List[str],
+        stages: np.ndarray,
+        harvestable: np.ndarray,
+        cycles: np.ndarray
+    ):
+        self.plot_ids = plot_ids
+        self.keys = keys
+        self.stages = stages
+        self.harvestable = harvestable
+        # Whole grow cycles completed since the last harvest (0 unless
+        # harvestable)
+        self.cycles = cycles
+        self.sprites = [
+            IMAGE_YIELD_MAP[key][stage] if key in IMAGE_YIELD_MAP else None
+            for key, stage in zip(keys, stages.tolist())
+        ]
+
+    def harvestable_plots(self) -> List[str]:
+        return [self.plot_ids[i] for i in np.flatnonzero(self.harvestable)]
+
+
+def compute_stages(
+    stage_counts: np.ndarray,
+    last_harvested: np.ndarray,
+    grow_time_hr: np.ndarray,
+    now: Optional[datetime] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute growth stages from plot columns with the exact arithmetic of
+    `get_stage`.
+
+    :param stage_counts: The number of stage images per plot (0 if none).
+    :param last_harvested: datetime64[us] last harvest times, NaT if never.
+    :param grow_time_hr: The grow time per yield, NaN or 0 if unknown.
+    :param now: The time to compute stages at, defaults to utcnow.
+    :return: A tuple of the stage of every plot and the number of grow
+    times elapsed since the last harvest (0 if not growing).
+    """
+    now = np.datetime64(now or datetime.utcnow(), "us")
+
+    growing = (
+        (stage_counts > 0) &
+        ~np.isnat(last_harvested) &
+        ~np.isnan(grow_time_hr) &
+        (grow_time_hr != 0)
+    )
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # timedelta.total_seconds() divides whole microseconds by 10**6
+        elapsed_us = (now - last_harvested).astype(np.int64)
+        time_since_last_harvest = elapsed_us / 1e6
+        time_per_yield = grow_time_hr * 3600
+        time_elapsed = time_since_last_harvest / time_per_yield
+        scaled = np.trunc(time_elapsed * stage_counts)
+
+    scaled = np.where(growing, scaled, 0).astype(np.int64)
+    stages = np.maximum(0, np.minimum(stage_counts, scaled) - 1)
+    return (np.where(growing, stages, 0), np.where(growing, time_elapsed, 0.0))
+
+
+def _harvest_state(stage_counts, stages, time_elapsed) -> Tuple[np.ndarray, np.ndarray]:
+    harvestable = (stage_counts > 0) & (stages == stage_counts - 1)
+    # A harvestable plot has always completed at least one cycle, even if
+    # rounding puts time_elapsed a hair under 1.
+    cycles = np.where(
+        harvestable, np.maximum(1, np.floor(time_elapsed)), 0).astype(np.int64)
+    return (harvestable, cycles)
+
+
+def compute_growth_batch(plot_states: List[Dict], now: Optional[datetime] = None) -> List[FarmGrowth]:
+    """
+    Compute the growth state of every plot in a batch of farms at once.
+
+    :param plot_states: The `plot` dict of each farm.
+    :param now: The time to compute stages at, defaults to utcnow.
+    :return: A `FarmGrowth` for each farm, in the same order.
+    """
+    plot_ids, keys, counts, last_harvested, grow_times = [], [], [], [], []
+    for plot_state in plot_states:
+        for plot_id, plot_item in plot_state.items():
+            data = plot_item.data
+            images = IMAGE_YIELD_MAP.get(plot_item.key)
+
+            plot_ids.append(plot_id)
+            keys.append(plot_item.key)
+            counts.append(len(images) if images else 0)
+            last_harvested.append(
+                data.last_harvested_at if data and data.last_harvested_at else NOT_HARVESTED)
+            grow_time_hr = plot_item.get_grow_time_hr() if data else None
+            grow_times.append(grow_time_hr if grow_time_hr else np.nan)
+
+            if images and not grow_time_hr:
+                logger.warning(
+                    f"Item {plot_item.key} does not have a grow time")
+
+    stage_counts = np.array(counts, dtype=np.int64)
+    stages, time_elapsed = compute_stages(
+        stage_counts,
+        np.array(last_harvested, dtype="datetime64[us]"),
+        np.array(grow_times, dtype=np.float64),
+        now
+    )
+    harvestable, cycles = _harvest_state(stage_counts, stages, time_elapsed)
+
+    growths = []
+    start = 0
+    for plot_state in plot_states:
+        end = start + len(plot_state)
+        growths.append(FarmGrowth(
+            plot_ids[start:end],
+            keys[start:end],
+            stages[start:end],
+            harvestable[start:end],
+            cycles[start:end]
+        ))
+        start = end
+
+    return growths
+
+
+def compute_growth(plot_state: Dict, now: Optional[datetime] = None) -> FarmGrowth:
+    """
+    Compute the growth state of every plot in a farm.
+
+    :param plot_state: The farm's plot dict (A1, A2, B5, etc.)
+    :param now: The time to compute stages at, defaults to utcnow.
+    :return: The farm's `FarmGrowth`.
+    """
+    return compute_growth_batch([plot_state], now)[0]
+
+
+def compute_compact_growth(farms: List, now: Optional[datetime] = None) -> List[FarmGrowth]:
+    """
+    Compute the growth state of a batch of `CompactFarm`s straight from their
+    array columns.
+
+    :param farms: The compact farms.
+    :param now: The time to compute stages at, defaults to utcnow.
+    :return: A `FarmGrowth` for each farm's planted plots, in grid order.
+    """
+    if not farms:
+        return []
+
+    planted = [farm.planted() for farm in farms]
+    keys = [farm.cells[i].key for farm, indexes in zip(farms, planted) for i in indexes]
+    stage_counts = np.array(
+        [len(IMAGE_YIELD_MAP.get(key, ())) for key in keys], dtype=np.int64)
+
+    # NOT_HARVESTED in the compact columns is the same bit pattern as NaT
+    last_harvested = np.concatenate([
+        np.frombuffer(farm.last_harvested_us, dtype=np.int64)[indexes]
+        for farm, indexes in zip(farms, planted)
+    ]).view("datetime64[us]")
+    grow_times = np.concatenate([
+        np.frombuffer(farm.grow_time_hr, dtype=np.float64)[indexes]
+        for farm, indexes in zip(farms, planted)
+    ])
+
+    for key, count, grow_time_hr in zip(keys, stage_counts.tolist(), grow_times.tolist()):
+        if count and (np.isnan(grow_time_hr) or not grow_time_hr):
+            logger.warning(f"Item {key} does not have a grow time")
+
+    stages, time_elapsed = compute_stages(
+        stage_counts, last_harvested, grow_times, now)
+    harvestable, cycles = _harvest_state(stage_counts, stages, time_elapsed)
+
+    growths = []
+    start = 0
+    for indexes in planted:
+        end = start + len(indexes)
+        growths.append(FarmGrowth(
+            [plot_id_at(i) for i in indexes],
+            keys[start:end],
+            stages[start:end],
+            harvestable[start:end],
+            cycles[start:end]
+        ))
+        start = end
+
+    return growths
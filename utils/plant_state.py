@@ -1,5 +1,6 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -74,13 +75,14 @@ IMAGE_YIELD_MAP = {
 }
 
 
-def get_stage(item: str, last_harvested: datetime, grow_time_hr: float):
+def get_stage(item: str, last_harvested: datetime, grow_time_hr: float, now: Optional[datetime] = None):
     """
     Determine the stage of the plant based on the item, yields remaining, and
     last harvested date.
 
     :param item: The item to determine the stage for (e.g. "plant:apple")
     :param last_harvested: The date the plant was last harvested
+    :param now: The time to determine the stage at, defaults to utcnow
     :return: The stage of the plant
     """
     images = IMAGE_YIELD_MAP.get(item)
@@ -97,7 +99,7 @@ def get_stage(item: str, last_harvested: datetime, grow_time_hr: float):
 
     # Handle plant stages
     time_since_last_harvest = (
-        datetime.utcnow() - last_harvested).total_seconds()
+        (now or datetime.utcnow()) - last_harvested).total_seconds()
     time_per_yield = grow_time_hr * 3600
     time_elapsed = time_since_last_harvest / time_per_yield
     stage = max(0, min(len(images), int(time_elapsed * len(images))) - 1)
@@ -105,38 +107,99 @@ def get_stage(item: str, last_harvested: datetime, grow_time_hr: float):
     return stage
 
 
-def can_harvest(item: str, last_harvested: datetime, grow_time_hr: float):
+def can_harvest(item: str, last_harvested: datetime, grow_time_hr: float, now: Optional[datetime] = None):
     """
     Determine if the plant can be harvested. Stage must be at the final stage
     to be considered harvestable.
 
     :param item: The item to determine the stage for (e.g. "plant:apple")
     :param last_harvested: The date the plant was last harvested
+    :param now: The time to check at, defaults to utcnow
     :return: True if the plant can be harvested, False otherwise
     """
     images = IMAGE_YIELD_MAP.get(item)
     if not images:
         return False
 
-    stage = get_stage(item, last_harvested, grow_time_hr)
+    stage = get_stage(item, last_harvested, grow_time_hr, now)
     return stage is not None and stage == len(images) - 1
 
 
-def get_image_for_plot_item_state(item: str, last_harvested: datetime, grow_time_hr: float):
+def get_image_for_plot_item_state(item: str, last_harvested: datetime, grow_time_hr: float, now: Optional[datetime] = None):
     """
     Get the image path for the plant stage based on the item, yields remaining,
     and last harvested date.
 
     :param item: The item to determine the stage for (e.g. "plant:apple")
     :param last_harvested: The date the plant was last harvested
+    :param now: The time to get the image at, defaults to utcnow
     :return: The image path for the plant stage
     """
     images = IMAGE_YIELD_MAP.get(item)
     if not images:
         raise ValueError(f"Item {item} does not have an image map")
 
-    stage = get_stage(item, last_harvested, grow_time_hr)
+    stage = get_stage(item, last_harvested, grow_time_hr, now)
     if isinstance(images, str):
         return images
 
     return images[stage]
+
+
+def get_stage_schedule(item: str, last_harvested: datetime, grow_time_hr: float) -> List[datetime]:
+    """
+    Get the times at which each stage of the plant begins. The last entry is
+    when the plant becomes harvestable. The times are exact to the
+    microsecond, so `get_stage(..., now=schedule[i])` is `i` and one
+    microsecond earlier it is `i - 1`.
+
+    :param item: The item to get the schedule for (e.g. "plant:apple")
+    :param last_harvested: The date the plant was last harvested
+    :param grow_time_hr: The time it takes to grow per yield
+    :return: The start time of every stage, or an empty list if the plant
+    never changes stage.
+    """
+    images = IMAGE_YIELD_MAP.get(item)
+    if not images or not grow_time_hr or not last_harvested:
+        return []
+
+    one_us = timedelta(microseconds=1)
+    time_per_yield = grow_time_hr * 3600
+    schedule = [last_harvested]
+    for stage in range(1, len(images)):
+        # Stage `n` starts once (n + 1) / len(images) of the grow time has
+        # passed. Floating point rounding can move the boundary by a few
+        # microseconds, so settle it against get_stage itself.
+        at = last_harvested + timedelta(
+            seconds=time_per_yield * (stage + 1) / len(images))
+        while get_stage(item, last_harvested, grow_time_hr, at) < stage:
+            at += one_us
+        while get_stage(item, last_harvested, grow_time_hr, at - one_us) >= stage:
+            at -= one_us
+        schedule.append(at)
+
+    return schedule
+
+
+def get_next_stage_change(
+    item: str,
+    last_harvested: datetime,
+    grow_time_hr: float,
+    now: Optional[datetime] = None
+) -> Optional[datetime]:
+    """
+    Get the next time the plant changes stage or becomes harvestable.
+
+    :param item: The item to check (e.g. "plant:apple")
+    :param last_harvested: The date the plant was last harvested
+    :param grow_time_hr: The time it takes to grow per yield
+    :param now: The time to look ahead from, defaults to utcnow
+    :return: The time of the next change, or None if it is fully grown or
+    never changes.
+    """
+    now = now or datetime.utcnow()
+    for at in get_stage_schedule(item, last_harvested, grow_time_hr):
+        if at > now:
+            return at
+
+    return None
@@ -1,16 +1,24 @@
 import discord
 
+from models.user import UserModel
 
-async def require_user(ctx: discord.context.ApplicationContext, user):
+_UNSET = object()
+
+
+async def require_user(ctx: discord.context.ApplicationContext, user=_UNSET):
     """
     A helper function to check if a user has an account in the database.
     If the user does not have an account, a message will be sent to the ctx
     automatically.
 
     :param ctx: The context of the command.
-    :param user: The user object from the database.
+    :param user: The user object from the database. If omitted, only the
+    existence of the author's account is checked.
     :return: bool - True if the user exists, False if the user does not exist.
     """
+    if user is _UNSET:
+        user = await UserModel.exists(ctx.author.id)
+
     if not user:
         await ctx.respond("You don't have an account yet. Use </setup:1207866795147657217> to start your farm.", ephemeral=True)
         return False
@@ -1,16 +1,58 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
 from models.yieldmodel import YieldModel
-import random
 
 
-def get_yield_with_odds(yield_: YieldModel) -> int:
+def sample_yields(
+    specs: List[Tuple[YieldModel, int]],
+    rng: Optional[np.random.Generator] = None
+) -> List[int]:
+    """
+    Get the total amount of several yields over a number of harvest cycles
+    each, with odds factored in. min_amount and max_amount are used if they
+    are set. Every cycle's odds check and amount is drawn in one batch.
+
+    :param specs: A list of (yield, cycles) tuples.
+    :param rng: The generator to draw from. Pass a seeded generator
+    (`np.random.default_rng(seed)`) to replay a harvest deterministically.
+    :return: The total amount for each spec, in the same order.
+    """
+    if not specs:
+        return []
+
+    rng = rng or np.random.default_rng()
+
+    odds = np.clip([y.odds for y, _ in specs], 0, 1)
+    cycles = np.array([c for _, c in specs], dtype=np.int64)
+    ranged = np.array([
+        y.min_amount is not None and y.max_amount is not None for y, _ in specs
+    ])
+    low = np.array([y.min_amount if r else y.amount for (y, _), r in zip(specs, ranged)],
+                   dtype=np.int64)
+    high = np.array([y.max_amount if r else y.amount for (y, _), r in zip(specs, ranged)],
+                    dtype=np.int64)
+
+    # How many of the cycles hit their odds
+    hits = rng.binomial(cycles, odds)
+
+    # Every hit of a ranged yield draws its own amount
+    draws = np.repeat(np.arange(len(specs)), np.where(ranged, hits, 0))
+    amounts = rng.integers(low[draws], high[draws], endpoint=True)
+    totals = np.bincount(draws, weights=amounts, minlength=len(specs))
+
+    totals = np.where(ranged, totals, hits * low)
+    return [int(total) for total in totals]
+
+
+def get_yield_with_odds(yield_: YieldModel, rng: Optional[np.random.Generator] = None) -> int:
     """
     Get the yield with odds factored in.
     Also use min_amount and max_amount if they are set.
 
     :param yield_: The yield to get.
+    :param rng: The generator to draw from.
     :return: The yield amount.
     """
-    if yield_.min_amount != None and yield_.max_amount != None:
-        return random.randint(yield_.min_amount, yield_.max_amount) if yield_.odds >= random.random() else 0
-
-    return yield_.amount if yield_.odds >= random.random() else 0
+    return sample_yields([(yield_, 1)], rng)[0]
@@ -1,5 +1,6 @@
 from datetime import datetime
 import discord
+from db.challenge_progress import ChallengeProgress
 from db.shop_data import ShopData
 
 from models.user import UserModel
@@ -86,9 +87,13 @@ class ChallengesView(discord.ui.View):
         self.accept_button.disabled = is_accepted
         self.add_item(self.accept_button)
 
-        # Check if the challenge is completed
-        is_completed = is_challenge_completed(
-            self.challenges.options[self.selected_option])
+        # Check if the challenge is completed, tracked progress is the most
+        # recent
+        option = self.challenges.options[self.selected_option]
+        is_completed = ChallengeProgress.get_instance().is_completed(
+            self.profile.discord_id, self.selected_option, option.description)
+        if is_completed is None:
+            is_completed = is_challenge_completed(option)
 
         self.claim_button.disabled = not is_completed
         self.add_item(self.claim_button)
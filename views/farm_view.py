@@ -1,8 +1,11 @@
+from datetime import timezone
+
 import discord
 from discord.ui.item import Item
 
+from db.harvest import harvest_farm
 from db.shop_data import ShopData
-from images.render import render_farm
+from images.render import FARM_IMAGE_FILENAME, farm_image_files, render_farm
 from models.farm import FarmModel
 from models.user import UserModel
 from utils.emoji_map import EMOJI_MAP
@@ -90,28 +93,24 @@ class FarmView(discord.ui.View):
         await interaction.response.edit_message(view=self)
 
     async def on_harvest_clicked(self, interaction: discord.Interaction):
-        (harvest_yield, xp_earned) = self.farm.harvest()
+        # Saving the harvest and rendering may take a moment
+        await interaction.response.defer()
+
+        result = await harvest_farm(self.farm)
+        if not result:
+            self.farm = await FarmModel.find_by_discord_id(self.discord_user.id)
+            return await interaction.edit_original_response(
+                content="Your farm changed somewhere else, please try again.",
+                view=self
+            )
+
+        (harvest_yield, xp_earned) = result
         if not any(harvest_yield.values()):
-            return await interaction.response.edit_message(
+            return await interaction.edit_original_response(
                 content="You don't have anything to harvest!",
                 view=self
             )
 
-        await self.farm.save_plot()
-
-        await UserModel.give_items(self.discord_user.id, harvest_yield, 0, stats={
-            "xp": xp_earned,
-            "harvest.xp": xp_earned,
-            "harvest.count": 1,
-            **{
-                f"harvest.{item_key}": amount
-                for item_key, amount in harvest_yield.items()
-            }
-        })
-
-        await UserModel.increment_challenge_progress(
-            self.discord_user.id, "harvest", "count")
-
         formatted_yield = ""
         for item, yields in harvest_yield.items():
             formatted_yield += f"{EMOJI_MAP[item]} {yields.amount}x\n"
@@ -120,10 +119,11 @@ class FarmView(discord.ui.View):
         self.add_item(self.back_button)
         self.remove_stage_one_buttons()
 
-        await interaction.response.edit_message(
+        embed = self.create_farm_embed(self.discord_user.display_name)
+        await interaction.edit_original_response(
             content=f"You harvested your farm and earned a total of +**{xp_earned} XP**!\n\n{formatted_yield}",
-            embed=self.create_farm_embed(self.discord_user.display_name),
-            files=[await render_farm(self.farm)],
+            embed=embed,
+            files=farm_image_files(embed, await render_farm(self.farm)),
             view=self
         )
 
@@ -182,8 +182,7 @@ class FarmView(discord.ui.View):
             if self.selected_plant and self.farm.plant(
                 location,
                 self.selected_plant
-            ):
-                await self.farm.save_plot()
+            ) and await self.farm.save_plot():
                 await UserModel.inc_stats(
                     self.farm.discord_id,
                     {
@@ -199,13 +198,24 @@ class FarmView(discord.ui.View):
                 await UserModel.increment_challenge_progress(
                     self.farm.discord_id, "plant", self.selected_plant.key)
 
-                await interaction.response.edit_message(
+                # Rendering may have to wait for a free worker
+                await interaction.response.defer()
+                embed = self.create_farm_embed(self.discord_user.display_name)
+                await interaction.edit_original_response(
                     content=f"You planted {self.selected_plant.name} {EMOJI_MAP[self.selected_plant.key]} on {location}!",
-                    files=[await render_farm(self.farm)],
+                    files=farm_image_files(embed, await render_farm(self.farm)),
                     view=self,
-                    embed=self.create_farm_embed(
-                        self.discord_user.display_name
-                    ),
+                    embed=embed,
+                )
+            else:
+                # The plot is taken or the farm changed somewhere else
+                self.farm = await FarmModel.find_by_discord_id(self.farm.discord_id)
+                self.selected_letter = None
+                self.selected_number = None
+
+                await interaction.response.edit_message(
+                    content="You can't plant that here!",
+                    view=self
                 )
         else:
             await interaction.response.defer()
@@ -216,7 +226,12 @@ class FarmView(discord.ui.View):
             color=discord.Color.embed_background()
         )
 
-        embed.set_image(url="attachment://farm.png")
+        next_change = self.farm.next_stage_change()
+        if next_change:
+            embed.description = "Next change " + discord.utils.format_dt(
+                next_change.replace(tzinfo=timezone.utc), "R")
+
+        embed.set_image(url=f"attachment://{FARM_IMAGE_FILENAME}")
         return embed
 
     async def on_select_plot_letter(self, interaction):